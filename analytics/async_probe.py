@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import queue
+import shutil
+import signal
+import asyncio
+import datetime
+import threading
+from collections import deque
+from typing import Iterator, Optional, Union
+from analytics.container_parsers import parse_header
+from analytics.mp4_handler import get_encoding
+from analytics.event_log import get_error_class
+from analytics.probe_pool import (ProbeResult, MAX_PENDING_RESULTS,
+                                  DEADLINE_ERROR_CLASS, complete_probe,
+                                  get_probe_timeout)
+from analytics.io_scheduler import DeviceQueue
+from analytics.deadline_scheduler import DeadlineScheduler
+
+FFPROBE_ARGS = ['-v', 'error', '-print_format', 'json',
+                '-show_format', '-show_streams']
+DEFAULT_PROBE_CONCURRENCY = 4
+
+def get_ffprobe_path() -> Optional[str]:
+    return os.environ.get('FFPROBE_BINARY') or shutil.which('ffprobe')
+
+def parse_ffprobe_output(output: bytes) -> dict:
+    data = json.loads(output)
+    video = next((stream for stream in data.get('streams', [])
+                  if stream.get('codec_type') == 'video'), None)
+    if video is None:
+        raise RuntimeError("No video stream")
+    duration = data.get('format', {}).get('duration') or video.get('duration')
+    if duration is None:
+        raise RuntimeError("No duration")
+    width, height = int(video['width']), int(video['height'])
+    rotation = video.get('tags', {}).get('rotate')
+    for side_data in video.get('side_data_list', []):
+        rotation = side_data.get('rotation', rotation)
+    if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+    return {'duration': float(duration), 'width': width, 'height': height}
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+async def run_ffprobe(file_path: os.PathLike, ffprobe: str = None,
+                      timeout: float = None) -> dict:
+    ffprobe = ffprobe or get_ffprobe_path()
+    if ffprobe is None:
+        raise RuntimeError("ffprobe not found")
+    process = await asyncio.create_subprocess_exec(
+        ffprobe, *FFPROBE_ARGS, file_path, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    # ffprobe runs in its own session, so it doesn't get the terminal's
+    # Ctrl-C: it is killed here on timeout and on cancellation.
+    try:
+        output, errors = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        _kill_process_group(process)
+        await process.wait()
+        raise TimeoutError(f"ffprobe timed out after {timeout:g} secs")
+    except asyncio.CancelledError:
+        _kill_process_group(process)
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {errors.decode(errors='replace').strip()}")
+    return parse_ffprobe_output(output)
+
+async def get_video_info_async(file_path: os.PathLike,
+                               semaphore: asyncio.Semaphore = None,
+                               ffprobe: str = None,
+                               timeout: float = None) -> dict:
+    # Same result as get_video_info, with an ffprobe subprocess instead of
+    # moviepy when none of the native container parsers can read the file.
+    start_time = time.time()
+    sniff_time_start = time.perf_counter()
+    try:
+        encoding = await asyncio.to_thread(get_encoding, file_path)
+    except RuntimeError as e:
+        raise RuntimeError(f"Finding encoding error: {e}")
+    sniff_time = time.perf_counter() - sniff_time_start
+    probe_time_start = time.perf_counter()
+    try:
+        try:
+            header = await asyncio.to_thread(parse_header, file_path)
+        except OSError:
+            header = None
+        if header is None:
+            if semaphore is None:
+                header = await run_ffprobe(file_path, ffprobe, timeout)
+            else:
+                async with semaphore:
+                    header = await run_ffprobe(file_path, ffprobe, timeout)
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        raise RuntimeError("Error getting video info: File not found")
+    except Exception as e:
+        raise RuntimeError(f"Error occurred in getting video info: {e}")
+    return {
+        'encoding': encoding,
+        'size': stat.st_size,
+        'duration': header['duration'],
+        'creation_time': datetime.datetime.fromtimestamp(stat.st_ctime),
+        'time_taken': time.time() - start_time,
+        'resolution_width': header['width'],
+        'resolution_height': header['height'],
+        'stage_times': {'sniff': sniff_time,
+                        'probe': time.perf_counter() - probe_time_start}
+    }
+
+async def probe_file_async(file_path: os.PathLike, semaphore: asyncio.Semaphore,
+                           ffprobe: str = None,
+                           timeout: float = None) -> ProbeResult:
+    details = {'worker': os.getpid(), 'error_class': None}
+    start_time = time.perf_counter()
+    try:
+        info = await get_video_info_async(file_path, semaphore, ffprobe, timeout)
+        details['elapsed'] = time.perf_counter() - start_time
+        return file_path, info, None, details
+    except Exception as e:
+        details['elapsed'] = time.perf_counter() - start_time
+        details['error_class'] = get_error_class(e)
+        return file_path, None, str(e), details
+
+async def _probe_within(file_path: os.PathLike, semaphore: asyncio.Semaphore,
+                        ffprobe: str, timeout: Optional[float], limit: float,
+                        deadline_bound: bool) -> ProbeResult:
+    # The deadline also covers the wait for the semaphore, cancelling the
+    # probe kills its ffprobe.
+    if not deadline_bound:
+        return await probe_file_async(file_path, semaphore, ffprobe, timeout)
+    start_time = time.perf_counter()
+    try:
+        return await asyncio.wait_for(
+            probe_file_async(file_path, semaphore, ffprobe, timeout), limit)
+    except asyncio.TimeoutError:
+        return file_path, None, 'Probe stopped at the execution deadline', {
+            'worker': os.getpid(), 'error_class': DEADLINE_ERROR_CLASS,
+            'elapsed': time.perf_counter() - start_time}
+
+async def _dispatch(scheduler: Union[DeadlineScheduler, DeviceQueue],
+                    results: queue.Queue, concurrency: int,
+                    timeout: float) -> None:
+    # The semaphore bounds the ffprobe subprocesses, files the native parser
+    # handles only need a thread, so twice as many probes are kept going.
+    # With a DeviceQueue the per-device limit caps them as well. Results are
+    # released in submission order. In deadline runs no probe gets more
+    # than the time left when it is handed out.
+    semaphore = asyncio.Semaphore(concurrency)
+    time_left = (scheduler.get_time_left
+                 if isinstance(scheduler, DeadlineScheduler) else None)
+    ffprobe = get_ffprobe_path()
+    pending = set()
+    submitted = deque()
+    try:
+        while True:
+            while (len(pending) < 2 * concurrency
+                   and len(submitted) - len(pending) < MAX_PENDING_RESULTS):
+                file = scheduler.next_file()
+                if file is None:
+                    break
+                task = asyncio.ensure_future(_probe_within(
+                    file, semaphore, ffprobe, timeout,
+                    *get_probe_timeout(timeout, time_left)))
+                pending.add(task)
+                submitted.append(task)
+            if not submitted:
+                return
+            if pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    complete_probe(scheduler, task.result())
+            while submitted and submitted[0].done():
+                # Blocks while the consumer is behind, which pauses dispatching
+                await asyncio.to_thread(results.put, submitted.popleft().result())
+    finally:
+        # Cancelled when the consumer stops early, running ffprobes are
+        # killed by their tasks.
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+def probe_scheduled_files_async(scheduler: Union[DeadlineScheduler, DeviceQueue],
+                                concurrency: int = DEFAULT_PROBE_CONCURRENCY,
+                                timeout: float = None) -> Iterator[ProbeResult]:
+    # Runs the event loop in a thread so results can be consumed by the
+    # regular synchronous processing loop as they arrive. Closing the
+    # generator cancels the loop and kills outstanding ffprobes.
+    results = queue.Queue(maxsize=4 * max(1, concurrency))
+    done = object()
+    errors = []
+    control = {}
+    stopping = threading.Event()
+
+    async def run():
+        control['loop'] = asyncio.get_running_loop()
+        control['task'] = asyncio.current_task()
+        if stopping.is_set():
+            return
+        await _dispatch(scheduler, results, max(1, concurrency), timeout)
+
+    def run_loop():
+        try:
+            asyncio.run(run())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=run_loop, daemon=True, name='async-probe')
+    thread.start()
+    try:
+        while (result := results.get()) is not done:
+            yield result
+    finally:
+        stopping.set()
+        if 'task' in control:
+            try:
+                control['loop'].call_soon_threadsafe(control['task'].cancel)
+            except RuntimeError:
+                pass
+        # Keep draining, the loop may be blocked handing over a result
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,98 @@
+import os
+import struct
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+RIFF_MAGIC = b'RIFF'
+AVI_FORM_TYPES = {b'AVI ', b'AVIX'}
+MAX_CHUNKS = 256
+
+def _iter_chunks(file: BinaryIO, start: int,
+                 end: int) -> Iterator[Tuple[bytes, int, int]]:
+    offset = start
+    for _ in range(MAX_CHUNKS):
+        if offset + 8 > end:
+            return
+        file.seek(offset)
+        header = file.read(8)
+        if len(header) < 8:
+            return
+        chunk_id, size = struct.unpack('<4sI', header)
+        data_end = min(offset + 8 + size, end)
+        yield chunk_id, offset + 8, data_end
+        # Chunks are padded to an even size
+        offset = offset + 8 + size + (size & 1)
+
+def _read_list_type(file: BinaryIO, start: int) -> bytes:
+    file.seek(start)
+    return file.read(4)
+
+def _parse_avih(data: bytes) -> Optional[dict]:
+    if len(data) < 40:
+        return None
+    (usecs_per_frame, _, _, _, total_frames, _, _, _,
+     width, height) = struct.unpack('<10I', data[:40])
+    return {'usecs_per_frame': usecs_per_frame, 'total_frames': total_frames,
+            'width': width, 'height': height}
+
+def _parse_strh(data: bytes) -> Optional[dict]:
+    if len(data) < 36:
+        return None
+    stream_type = data[:4]
+    scale, rate, _, length = struct.unpack('<IIII', data[20:36])
+    return {'type': stream_type, 'scale': scale, 'rate': rate, 'length': length}
+
+def _parse_hdrl(file: BinaryIO, start: int, end: int) -> dict:
+    header = {}
+    for chunk_id, data_start, data_end in _iter_chunks(file, start, end):
+        if chunk_id == b'avih':
+            file.seek(data_start)
+            header['avih'] = _parse_avih(file.read(min(data_end - data_start, 56)))
+        elif chunk_id == b'LIST':
+            list_type = _read_list_type(file, data_start)
+            if list_type == b'strl' and 'video' not in header:
+                for child_id, child_start, child_end in _iter_chunks(
+                        file, data_start + 4, data_end):
+                    if child_id == b'strh':
+                        file.seek(child_start)
+                        stream = _parse_strh(file.read(min(child_end - child_start,
+                                                           56)))
+                        if stream and stream['type'] == b'vids':
+                            header['video'] = stream
+                        break
+            elif list_type == b'odml':
+                for child_id, child_start, child_end in _iter_chunks(
+                        file, data_start + 4, data_end):
+                    if child_id == b'dmlh' and child_end - child_start >= 4:
+                        # OpenDML files count all RIFF-AVIX parts here
+                        file.seek(child_start)
+                        header['total_frames'] = struct.unpack('<I', file.read(4))[0]
+    return header
+
+def parse_avi_header(file_path: os.PathLike) -> Optional[dict]:
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        riff = file.read(12)
+        if len(riff) < 12 or riff[:4] != RIFF_MAGIC or riff[8:12] not in AVI_FORM_TYPES:
+            return None
+        header = None
+        for chunk_id, data_start, data_end in _iter_chunks(file, 12, file_size):
+            if chunk_id == b'LIST' and _read_list_type(file, data_start) == b'hdrl':
+                header = _parse_hdrl(file, data_start + 4, data_end)
+                break
+    if not header or not header.get('avih'):
+        return None
+    avih = header['avih']
+    video = header.get('video')
+    frames = max(avih['total_frames'], header.get('total_frames', 0),
+                 video['length'] if video else 0)
+    if video and video['rate'] and video['scale']:
+        duration = frames * video['scale'] / video['rate']
+    else:
+        duration = frames * avih['usecs_per_frame'] / 1e6
+    if not duration or not avih['width'] or not avih['height']:
+        return None
+    return {
+        'duration': duration,
+        'width': avih['width'],
+        'height': avih['height']
+    }
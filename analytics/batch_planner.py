@@ -0,0 +1,40 @@
+import bisect
+
+MIN_RUN_FILL = 0.5
+
+def plan_runs(files_sizes: dict, capacity: float) -> list[list]:
+    # Best-fit decreasing: every file goes into the fullest run that still
+    # has room for it. Files larger than the capacity get a run of their own.
+    runs = []
+    run_loads = []
+    free_space = []
+    for file, size in sorted(files_sizes.items(), key=lambda x: (-x[1], x[0])):
+        position = bisect.bisect_left(free_space, (size, -1))
+        if position < len(free_space) and size <= capacity:
+            space, run_index = free_space.pop(position)
+            runs[run_index].append(file)
+            run_loads[run_index] += size
+            bisect.insort(free_space, (space - size, run_index))
+            continue
+        runs.append([file])
+        run_loads.append(size)
+        if size < capacity:
+            bisect.insort(free_space, (capacity - size, len(runs) - 1))
+    order = sorted(range(len(runs)), key=lambda i: -run_loads[i])
+    return [runs[i] for i in order]
+
+def prune_plan(runs: list[list], files_sizes: dict, capacity: float,
+               min_fill: float = MIN_RUN_FILL) -> list[list]:
+    # Finished files are dropped from the stored plan. Failed or interrupted
+    # leftovers would make a nearly empty next run, so when the first run
+    # falls under min_fill of the capacity the remaining files are packed
+    # again.
+    pruned = []
+    for run in runs:
+        run = [file for file in run if file in files_sizes]
+        if run:
+            pruned.append(run)
+    if (len(pruned) > 1
+            and sum(files_sizes[file] for file in pruned[0]) < min_fill * capacity):
+        return plan_runs(files_sizes, capacity)
+    return pruned
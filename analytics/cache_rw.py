@@ -1,6 +1,11 @@
 import os
+import json
+import shutil
+from typing import Iterator
 from analytics.utils import (write_file, update_csv, extract_info_from_file,
-                             read_csv)
+                             read_csv, iter_csv, rewrite_csv, RAW_CSV_SCHEMA)
+from analytics.metadata_index import MetadataIndex
+from analytics.column_store import ColumnStore, ColumnTable
 
 class CacheRW:
 
@@ -16,6 +21,10 @@ class CacheRW:
                                          self.report_dir + 'files.csv')
         self.csv_raw_file = kwargs.get('csv_raw_file',
                                        self.report_dir + 'files_raw.csv')
+        self.columns_dir = kwargs.get('columns_dir',
+                                      self.report_dir + 'columns/')
+        self.monthly_aggregates_file = kwargs.get('monthly_aggregates_file',
+                                                  self.report_dir + 'monthly_aggregates.json')
         self.summary_file = kwargs.get('summary_file',
                                        self.report_dir + 'summary.txt')
         self.full_summary_file = kwargs.get('full_summary_file',
@@ -32,6 +41,21 @@ class CacheRW:
                                                 self.report_dir + 'monthly_data_analysis.jpg')
         self.destination_file = kwargs.get('destination_file',
                                            self.proj_cache_dir + 'destination.txt')
+        self.index_db_file = kwargs.get('index_db_file',
+                                        self.proj_cache_dir + 'metadata_index.db')
+        self.run_plan_file = kwargs.get('run_plan_file',
+                                        self.file_lists_dir + 'run_plan.json')
+        self.perf_model_file = kwargs.get('perf_model_file',
+                                          self.proj_cache_dir + 'perf_model.json')
+        self.summary_state_file = kwargs.get('summary_state_file',
+                                             self.proj_cache_dir + 'summary_state.json')
+        self.event_log_file = kwargs.get('event_log_file',
+                                         self.proj_cache_dir + 'events.jsonl')
+        self.instrumentation_file = kwargs.get('instrumentation_file',
+                                               self.report_dir + 'instrumentation.json')
+        self.profile_file = kwargs.get('profile_file',
+                                       self.report_dir + 'profile.prof')
+        self._index = None
         self.make_dirs()
 
     def make_dirs(self):
@@ -89,6 +113,120 @@ class CacheRW:
         except Exception as e:
             raise RuntimeError(f"Exception happened in writing: {e}")
 
+    def write_run_plan(self, capacity_gb: float, runs: list[list[str]]) -> None:
+        try:
+            with open(self.run_plan_file, 'w', encoding='utf-8') as file:
+                json.dump({'capacity_gb': capacity_gb, 'runs': runs}, file)
+            if self._verbose:
+                print("Run plan updated.")
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in writing: {e}")
+
+    def write_perf_model(self, model_state: dict) -> None:
+        try:
+            with open(self.perf_model_file, 'w', encoding='utf-8') as file:
+                json.dump(model_state, file)
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in writing: {e}")
+
+    def append_checkpoint(self, directory: os.PathLike,
+                          processed_files: list[os.PathLike],
+                          clean_rows: list[dict], raw_rows: list[dict],
+                          index_records: list[tuple]) -> None:
+        # All or nothing: the sizes of the output files are journaled in the
+        # index first and the records commit together with clearing that
+        # journal. A failed or interrupted commit is rolled back, so a retry
+        # never duplicates rows.
+        try:
+            # Caches from before the column store get their history imported
+            # first, the new rows must not start a store of their own.
+            store = self.ensure_raw_columns()
+            index = self.get_index(directory)
+            index.begin_commit({
+                'sizes': {path: os.path.getsize(path) if os.path.exists(path) else 0
+                          for path in (self.csv_clean_file, self.csv_raw_file,
+                                       self.file_list_processed_file)},
+                'columns': store.read_meta()
+            })
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in writing: {e}")
+        try:
+            update_csv(clean_rows, self.csv_clean_file, sync=True)
+            update_csv(raw_rows, self.csv_raw_file, sync=True)
+            store.append_rows(raw_rows)
+            write_file(self.file_list_processed_file, processed_files, 'a',
+                       sync=True)
+            index.upsert_records(index_records, end_commit=True)
+        except Exception as e:
+            try:
+                self._rollback_checkpoint(index)
+            except Exception as rollback_error:
+                raise RuntimeError(f"Exception happened in writing: {e} "
+                                   f"(rollback failed: {rollback_error})")
+            raise RuntimeError(f"Exception happened in writing: {e}")
+
+    def _rollback_checkpoint(self, index: MetadataIndex) -> bool:
+        pending = index.get_pending_commit()
+        if pending is None:
+            return False
+        for path, size in pending['sizes'].items():
+            if os.path.exists(path):
+                with open(path, 'r+b') as file:
+                    file.truncate(size)
+        ColumnStore(self.columns_dir).restore_meta(pending['columns'])
+        index.clear_pending_commit()
+        return True
+
+    def rewrite_history(self, directory: os.PathLike, dropped_names: set,
+                        renamed_names: dict) -> None:
+        # Rows of files that changed on disk are dropped before they are
+        # probed again, renamed files get their new name. The summary state
+        # and the monthly aggregates can't take rows out, so they are
+        # rebuilt from scratch. The index goes last, so an interrupted
+        # rewrite is simply done again on the next run.
+        def transform(row: dict) -> dict:
+            if row['file'] in dropped_names:
+                return None
+            row['file'] = renamed_names.get(row['file'], row['file'])
+            return row
+
+        try:
+            for state_file in (self.summary_state_file,
+                               self.monthly_aggregates_file):
+                if os.path.exists(state_file):
+                    os.remove(state_file)
+            rewrite_csv(self.csv_clean_file, transform)
+            rewrite_csv(self.csv_raw_file, transform)
+            self.rebuild_raw_columns()
+            index = self.get_index(directory)
+            index.delete_paths(dropped_names)
+            for old_name, new_name in renamed_names.items():
+                index.move_path(old_name, new_name)
+            if self._verbose:
+                print(f"History rewritten: {len(dropped_names)} changed and "
+                      f"{len(renamed_names)} renamed files.")
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in writing: {e}")
+
+    def rebuild_raw_columns(self) -> int:
+        store_dir = self.columns_dir.rstrip('/\\')
+        tmp_dir = store_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        imported = ColumnStore(tmp_dir).import_rows(self.iter_raw_csv_file())
+        shutil.rmtree(store_dir, ignore_errors=True)
+        if os.path.exists(tmp_dir):
+            os.replace(tmp_dir, store_dir)
+        return imported
+
+    def write_summary_state(self, summary_state: dict) -> None:
+        try:
+            tmp_file = self.summary_state_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as file:
+                json.dump(summary_state, file)
+            os.replace(tmp_file, self.summary_state_file)
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in writing: {e}")
+
     def read_full_files_list(self) -> list[os.PathLike]:
         try:
             return extract_info_from_file(self.file_list_full_file)
@@ -107,6 +245,33 @@ class CacheRW:
         except Exception as e:
             raise RuntimeError(f"Exception happened in reading: {e}")
 
+    def read_run_plan(self) -> dict:
+        if not os.path.exists(self.run_plan_file):
+            return {}
+        try:
+            with open(self.run_plan_file, encoding='utf-8') as file:
+                return json.load(file)
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in reading: {e}")
+
+    def read_perf_model(self) -> dict:
+        if not os.path.exists(self.perf_model_file):
+            return {}
+        try:
+            with open(self.perf_model_file, encoding='utf-8') as file:
+                return json.load(file)
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in reading: {e}")
+
+    def read_summary_state(self) -> dict:
+        if not os.path.exists(self.summary_state_file):
+            return {}
+        try:
+            with open(self.summary_state_file, encoding='utf-8') as file:
+                return json.load(file)
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in reading: {e}")
+
     def read_destination(self) -> os.PathLike:
         try:
             return extract_info_from_file(self.destination_file)
@@ -115,3 +280,53 @@ class CacheRW:
 
     def read_raw_csv_file(self) -> list[dict]:
         return read_csv(self.csv_raw_file)
+
+    def iter_raw_csv_file(self) -> Iterator[dict]:
+        if not os.path.exists(self.csv_raw_file):
+            return iter(())
+        return iter_csv(self.csv_raw_file, RAW_CSV_SCHEMA)
+
+    def read_raw_columns_count(self) -> int:
+        return ColumnStore(self.columns_dir).read_meta()['rows']
+
+    def ensure_raw_columns(self) -> ColumnStore:
+        store = ColumnStore(self.columns_dir)
+        if not store.exists() and os.path.exists(self.csv_raw_file):
+            imported = self.rebuild_raw_columns()
+            if self._verbose:
+                print(f"Columnar store imported {imported} CSV rows.")
+        return store
+
+    def read_raw_columns(self) -> ColumnTable:
+        try:
+            return self.ensure_raw_columns().load()
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in reading: {e}")
+
+    def get_index(self, directory: os.PathLike) -> MetadataIndex:
+        if self._index is None:
+            try:
+                self._index = MetadataIndex(self.index_db_file)
+            except Exception as e:
+                raise RuntimeError(f"Exception happened in opening index: {e}")
+            if self._rollback_checkpoint(self._index) and self._verbose:
+                print("Interrupted checkpoint rolled back.")
+            if self._index.count() == 0 and os.path.exists(self.csv_raw_file):
+                imported = self._index.import_csv_rows(self.iter_raw_csv_file(),
+                                                       directory)
+                if self._verbose:
+                    print(f"Metadata index imported {imported} CSV rows.")
+        return self._index
+
+    def read_index_fingerprints(self, directory: os.PathLike) -> dict:
+        return self.get_index(directory).get_fingerprints()
+
+    def read_index_failures(self, directory: os.PathLike) -> dict:
+        return self.get_index(directory).get_failures()
+
+    def write_index_failures(self, directory: os.PathLike,
+                             failures: list[tuple]) -> None:
+        try:
+            self.get_index(directory).record_failures(failures)
+        except Exception as e:
+            raise RuntimeError(f"Exception happened in writing: {e}")
@@ -0,0 +1,102 @@
+import os
+import time
+from analytics.cache_rw import CacheRW
+from analytics.instrumentation import instruments
+from analytics.pipeline import PipelineStage, PipelineError
+
+class CheckpointWriter:
+
+    def __init__(self, cache: CacheRW, directory: os.PathLike,
+                 commit_every: int = 32, commit_interval: float = 5.0,
+                 background: bool = False, max_pending: int = 256) -> None:
+        self.cache_obj = cache
+        self.directory = directory
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.committed_count = 0
+        self._last_commit = time.time()
+        self._reset()
+        # In background mode the writes and fsyncs run on a writer thread fed
+        # through a bounded queue, so probing carries on while they happen.
+        self._stage = None
+        self._failed = False
+        if background:
+            self._stage = PipelineStage(self._handle, max_pending=max_pending,
+                                        on_idle=self._commit_if_due,
+                                        idle_interval=commit_interval,
+                                        name='checkpoint')
+
+    def _reset(self) -> None:
+        self._processed = []
+        self._clean_rows = []
+        self._raw_rows = []
+        self._index_records = []
+        self._failures = []
+
+    def _handle(self, entry: tuple) -> None:
+        kind, args = entry
+        if kind == 'row':
+            self._add_row(*args)
+        else:
+            self._failures.append(args)
+
+    def _commit_if_due(self) -> None:
+        if time.time() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def add(self, file: os.PathLike, clean_row: dict, raw_row: dict,
+            index_record: tuple) -> None:
+        if self._stage is not None:
+            self._put(('row', (file, clean_row, raw_row, index_record)))
+        else:
+            self._add_row(file, clean_row, raw_row, index_record)
+
+    def _put(self, entry: tuple) -> None:
+        try:
+            self._stage.put(entry)
+        except PipelineError:
+            self._failed = True
+            raise
+
+    def _add_row(self, file: os.PathLike, clean_row: dict, raw_row: dict,
+                 index_record: tuple) -> None:
+        self._processed.append(file)
+        self._clean_rows.append(clean_row)
+        self._raw_rows.append(raw_row)
+        self._index_records.append(index_record)
+        if (len(self._processed) >= self.commit_every
+                or time.time() - self._last_commit >= self.commit_interval):
+            self.commit()
+
+    def add_failure(self, failure: tuple) -> None:
+        if self._stage is not None:
+            self._put(('failure', failure))
+        else:
+            self._failures.append(failure)
+
+    def commit(self) -> None:
+        self._last_commit = time.time()
+        if self._failures:
+            self.cache_obj.write_index_failures(self.directory, self._failures)
+            self._failures = []
+        if not self._processed:
+            return
+        # The index is written last: a file only counts as processed once
+        # its rows are durably in the CSVs.
+        with instruments.timer('csv write'):
+            self.cache_obj.append_checkpoint(self.directory, self._processed,
+                                             self._clean_rows, self._raw_rows,
+                                             self._index_records)
+        instruments.count('checkpoint commits')
+        self.committed_count += len(self._processed)
+        self._reset()
+
+    def close(self) -> None:
+        # Once the writer has failed nothing more is committed, the files
+        # of the uncommitted rows are simply probed again next run.
+        if self._stage is not None:
+            stage, self._stage = self._stage, None
+            stage.close()
+            if self._failed:
+                return
+        self.commit()
@@ -0,0 +1,186 @@
+import os
+import json
+import itertools
+import datetime
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    import numpy as np
+
+NUMERIC_COLUMNS = {
+    'size (MB)': ('size_mb.f8', 'float64'),
+    'duration (mins)': ('duration_mins.f8', 'float64'),
+    'resolution (h)': ('resolution_h.f8', 'float64'),
+    'processing time': ('processing_time.f8', 'float64')
+}
+DATE_COLUMN = ('creation date', 'creation_date.i8', 'datetime64[us]')
+ENCODING_COLUMN = ('encoding', 'encoding.i4', 'int32')
+FILE_NAMES_BLOB = 'file_names.bin'
+FILE_OFFSETS = ('file_offsets.i8', 'int64')
+META_FILE = 'meta.json'
+
+def to_datetime64(value) -> 'np.datetime64':
+    import numpy as np
+    if isinstance(value, datetime.datetime):
+        return np.datetime64(value, 'us')
+    return np.datetime64(str(value).replace(' ', 'T'), 'us')
+
+class ColumnTable:
+
+    def __init__(self, columns: dict, encodings: list[str],
+                 name_offsets: 'np.ndarray', names_blob: 'np.ndarray',
+                 first_name_start: int = 0) -> None:
+        self.columns = columns
+        self.encodings = encodings
+        self._name_offsets = name_offsets
+        self._names_blob = names_blob
+        self._first_name_start = first_name_start
+
+    def __len__(self) -> int:
+        return len(self._name_offsets)
+
+    def __getitem__(self, column: str) -> 'np.ndarray':
+        return self.columns[column]
+
+    def get_file_name(self, row: int) -> str:
+        start = (int(self._name_offsets[row - 1]) if row > 0
+                 else self._first_name_start)
+        end = int(self._name_offsets[row])
+        return bytes(self._names_blob[start:end]).decode('utf-8')
+
+    def get_encoding(self, row: int) -> str:
+        return self.encodings[int(self.columns['encoding'][row])]
+
+    def slice(self, start: int, stop: int = None) -> 'ColumnTable':
+        stop = len(self) if stop is None else stop
+        first_name_start = (int(self._name_offsets[start - 1]) if start > 0
+                            else self._first_name_start)
+        return ColumnTable({column: values[start:stop]
+                            for column, values in self.columns.items()},
+                           self.encodings, self._name_offsets[start:stop],
+                           self._names_blob, first_name_start)
+
+    @classmethod
+    def from_rows(cls, rows: list[dict]) -> 'ColumnTable':
+        import numpy as np
+        encodings = []
+        encoding_codes = {}
+        columns = {column: np.array([float(row[column]) for row in rows],
+                                    dtype=dtype)
+                   for column, (_, dtype) in NUMERIC_COLUMNS.items()}
+        columns[DATE_COLUMN[0]] = np.array([to_datetime64(row[DATE_COLUMN[0]])
+                                            for row in rows],
+                                           dtype=DATE_COLUMN[2])
+        codes = []
+        for row in rows:
+            code = encoding_codes.setdefault(row['encoding'], len(encodings))
+            if code == len(encodings):
+                encodings.append(row['encoding'])
+            codes.append(code)
+        columns[ENCODING_COLUMN[0]] = np.array(codes, dtype=ENCODING_COLUMN[2])
+        encoded_names = [str(row['file']).encode('utf-8') for row in rows]
+        name_offsets = np.cumsum([len(name) for name in encoded_names],
+                                 dtype=np.int64)
+        names_blob = np.frombuffer(b''.join(encoded_names), dtype=np.uint8)
+        return cls(columns, encodings, name_offsets, names_blob)
+
+class ColumnStore:
+
+    def __init__(self, store_dir: os.PathLike) -> None:
+        self.store_dir = store_dir
+        self.meta_file = os.path.join(store_dir, META_FILE)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_file)
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.store_dir, file_name)
+
+    def read_meta(self) -> dict:
+        if not self.exists():
+            return {'rows': 0, 'blob_size': 0, 'encodings': []}
+        with open(self.meta_file, encoding='utf-8') as file:
+            return json.load(file)
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp_file = self.meta_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.meta_file)
+
+    def restore_meta(self, meta: dict) -> None:
+        # Rows past the restored count are dropped by the next append
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._write_meta(meta)
+
+    def _append_bytes(self, file_name: str, committed_size: int,
+                      data: bytes) -> None:
+        # Anything past the committed size is left over from an interrupted
+        # append and is dropped before writing.
+        path = self._path(file_name)
+        with open(path, 'ab') as file:
+            file.truncate(committed_size)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def append_rows(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        import numpy as np
+        os.makedirs(self.store_dir, exist_ok=True)
+        meta = self.read_meta()
+        committed_rows = meta['rows']
+        encodings = list(meta['encodings'])
+        for row in rows:
+            if row['encoding'] not in encodings:
+                encodings.append(row['encoding'])
+        table = ColumnTable.from_rows(rows)
+        for column, (file_name, dtype) in NUMERIC_COLUMNS.items():
+            self._append_bytes(file_name, committed_rows * np.dtype(dtype).itemsize,
+                               table[column].tobytes())
+        self._append_bytes(DATE_COLUMN[1], committed_rows * 8,
+                           table[DATE_COLUMN[0]].astype(np.int64).tobytes())
+        codes = np.array([encodings.index(encoding) for encoding in table.encodings],
+                         dtype=ENCODING_COLUMN[2])[table[ENCODING_COLUMN[0]]]
+        self._append_bytes(ENCODING_COLUMN[1], committed_rows * 4, codes.tobytes())
+        blob_size = meta['blob_size']
+        self._append_bytes(FILE_OFFSETS[0], committed_rows * 8,
+                           (table._name_offsets + blob_size).tobytes())
+        self._append_bytes(FILE_NAMES_BLOB, blob_size, table._names_blob.tobytes())
+        self._write_meta({
+            'rows': committed_rows + len(rows),
+            'blob_size': blob_size + len(table._names_blob),
+            'encodings': encodings
+        })
+
+    def import_rows(self, rows: Iterable[dict],
+                    chunk_size: int = 65536) -> int:
+        count = 0
+        rows = iter(rows)
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            self.append_rows(chunk)
+            count += len(chunk)
+        return count
+
+    def _map(self, file_name: str, dtype, count: int) -> 'np.ndarray':
+        import numpy as np
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(file_name), dtype=dtype, mode='r',
+                         shape=(count,))
+
+    def load(self) -> ColumnTable:
+        meta = self.read_meta()
+        rows = meta['rows']
+        columns = {column: self._map(file_name, dtype, rows)
+                   for column, (file_name, dtype) in NUMERIC_COLUMNS.items()}
+        columns[DATE_COLUMN[0]] = self._map(DATE_COLUMN[1], 'int64',
+                                            rows).view(DATE_COLUMN[2])
+        columns[ENCODING_COLUMN[0]] = self._map(ENCODING_COLUMN[1],
+                                                ENCODING_COLUMN[2], rows)
+        return ColumnTable(columns, meta['encodings'],
+                           self._map(FILE_OFFSETS[0], FILE_OFFSETS[1], rows),
+                           self._map(FILE_NAMES_BLOB, 'uint8', meta['blob_size']))
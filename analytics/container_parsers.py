@@ -0,0 +1,58 @@
+import os
+import struct
+from typing import Callable, Optional
+from analytics.mp4_parser import parse_mp4_header
+from analytics.mkv_parser import parse_mkv_header, EBML_MAGIC
+from analytics.avi_parser import parse_avi_header, RIFF_MAGIC, AVI_FORM_TYPES
+from analytics.ts_parser import parse_ts_header, detect_packet_size, PACKET_SIZES
+
+MAGIC_SIZE = max(PACKET_SIZES) * 3 + 4
+MP4_BOX_TYPES = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot'}
+# Extensions of the containers below, to cost files before they are opened
+NATIVE_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.webm', '.avi', '.ts',
+                     '.mts', '.m2ts')
+
+HEADER_PARSERS = []
+
+def register_parser(name: str, matcher: Callable[[bytes], bool],
+                    parser: Callable[[os.PathLike], Optional[dict]]) -> None:
+    HEADER_PARSERS.append((name, matcher, parser))
+
+def _is_mp4(magic: bytes) -> bool:
+    return magic[4:8] in MP4_BOX_TYPES
+
+def _is_mkv(magic: bytes) -> bool:
+    return magic[:4] == EBML_MAGIC
+
+def _is_avi(magic: bytes) -> bool:
+    return magic[:4] == RIFF_MAGIC and magic[8:12] in AVI_FORM_TYPES
+
+def _is_ts(magic: bytes) -> bool:
+    return detect_packet_size(magic) is not None
+
+register_parser('mp4', _is_mp4, parse_mp4_header)
+register_parser('matroska', _is_mkv, parse_mkv_header)
+register_parser('avi', _is_avi, parse_avi_header)
+register_parser('mpegts', _is_ts, parse_ts_header)
+
+def is_native_format(file_path: os.PathLike) -> bool:
+    return file_path.lower().endswith(NATIVE_EXTENSIONS)
+
+def _match_parser(file_path: os.PathLike) -> Optional[tuple]:
+    with open(file_path, 'rb') as file:
+        magic = file.read(MAGIC_SIZE)
+    for entry in HEADER_PARSERS:
+        if entry[1](magic):
+            return entry
+    return None
+
+def parse_header(file_path: os.PathLike) -> Optional[dict]:
+    # The parser is picked from the first bytes of the file, not from its
+    # extension. None means the caller has to fall back to a full decoder.
+    entry = _match_parser(file_path)
+    if entry is None:
+        return None
+    try:
+        return entry[2](file_path)
+    except (ValueError, IndexError, struct.error):
+        return None
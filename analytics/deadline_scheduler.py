@@ -0,0 +1,174 @@
+import time
+import bisect
+from typing import Callable, Optional
+
+DEFAULT_SECS_PER_GB = 10.0
+DEFAULT_SECS_PER_FILE = 0.5
+# Header probes read a few KB whatever the file size
+DEFAULT_NATIVE_SECS_PER_FILE = 0.05
+DEFAULT_FINALIZATION_RESERVE = 10.0
+RESERVE_MARGIN = 1.5
+
+NATIVE = 'native'
+DECODER = 'decoder'
+PRIORS = {
+    NATIVE: (DEFAULT_NATIVE_SECS_PER_FILE, 0.0),
+    DECODER: (DEFAULT_SECS_PER_FILE, DEFAULT_SECS_PER_GB)
+}
+FIT_FIELDS = ('count', 'sum_size', 'sum_time', 'sum_size_sq', 'sum_size_time')
+
+class CostModel:
+
+    def __init__(self, state: dict = None) -> None:
+        state = state or {}
+        # Models saved before the split have a single fit at the top level
+        self.fits = {}
+        for kind in PRIORS:
+            fit_state = state.get(kind, state if kind == DECODER else {})
+            self.fits[kind] = {field: fit_state.get(field, 0) for field in FIT_FIELDS}
+        self.finalization_time = state.get('finalization_time',
+                                           DEFAULT_FINALIZATION_RESERVE)
+
+    def to_dict(self) -> dict:
+        return {
+            **{kind: dict(fit) for kind, fit in self.fits.items()},
+            'finalization_time': self.finalization_time
+        }
+
+    def get_coefficients(self, kind: str = DECODER) -> tuple[float, float]:
+        # Least-squares fit of time = per_file + size_gb * per_gb
+        fit = self.fits[kind]
+        prior_per_file, prior_per_gb = PRIORS[kind]
+        count = fit['count']
+        if count == 0:
+            return prior_per_file, prior_per_gb
+        mean_size = fit['sum_size'] / count
+        mean_time = fit['sum_time'] / count
+        variance = fit['sum_size_sq'] / count - mean_size ** 2
+        if variance <= 1e-12:
+            if prior_per_gb <= 0 or not mean_size:
+                return mean_time, 0.0
+            return 0.0, mean_time / mean_size
+        per_gb = (fit['sum_size_time'] / count - mean_size * mean_time) / variance
+        per_gb = max(per_gb, 0.0)
+        per_file = max(mean_time - per_gb * mean_size, 0.0)
+        return per_file, per_gb
+
+    def predict(self, size_gb: float, kind: str = DECODER) -> float:
+        per_file, per_gb = self.get_coefficients(kind)
+        return per_file + size_gb * per_gb
+
+    def record(self, size_gb: float, elapsed: float, kind: str = DECODER) -> None:
+        fit = self.fits[kind]
+        fit['count'] += 1
+        fit['sum_size'] += size_gb
+        fit['sum_time'] += elapsed
+        fit['sum_size_sq'] += size_gb ** 2
+        fit['sum_size_time'] += size_gb * elapsed
+
+    def record_finalization(self, elapsed: float) -> None:
+        self.finalization_time = max(elapsed, 0.5 * self.finalization_time
+                                     + 0.5 * elapsed)
+
+    def get_finalization_reserve(self) -> float:
+        return self.finalization_time * RESERVE_MARGIN
+
+class DeadlineScheduler:
+
+    def __init__(self, files_sizes: dict, deadline: float,
+                 model: CostModel,
+                 is_native: Callable[[str], bool] = None) -> None:
+        # Files the native header parsers read and files that need a
+        # decoder are costed with separate fits, each kept sorted by size.
+        self.model = model
+        self.deadline = deadline
+        self._kinds = {file: NATIVE if is_native and is_native(file) else DECODER
+                       for file in files_sizes}
+        self._files = {kind: [] for kind in PRIORS}
+        self._sizes = {kind: [] for kind in PRIORS}
+        for file, size in sorted(files_sizes.items(), key=lambda x: x[1]):
+            self._files[self._kinds[file]].append(file)
+            self._sizes[self._kinds[file]].append(size)
+        self._sizes_by_file = dict(files_sizes)
+        self._started = {}
+        self._admitted = False
+
+    def start(self, budget_secs: float, now: float = None) -> None:
+        # The budget runs from when probing starts, planning and the preview
+        # don't use it up.
+        self.deadline = (time.time() if now is None else now) + budget_secs
+
+    def get_time_left(self, now: float = None) -> float:
+        now = time.time() if now is None else now
+        return self.deadline - self.model.get_finalization_reserve() - now
+
+    def predict(self, file: str) -> float:
+        return self.model.predict(self._sizes_by_file[file], self._kinds[file])
+
+    def _pick(self, sizes: dict, time_left: float,
+              first: bool) -> Optional[tuple[str, int]]:
+        # The largest file that fits in the time left, or the cheapest one
+        # when nothing fits yet, like an oversized file gets its own run:
+        # otherwise a pessimistic model is never measured and corrected.
+        best = None
+        best_cost = -1.0
+        for kind, kind_sizes in sizes.items():
+            if not kind_sizes:
+                continue
+            per_file, per_gb = self.model.get_coefficients(kind)
+            if time_left < per_file:
+                continue
+            if per_gb <= 0:
+                position = len(kind_sizes) - 1
+            else:
+                position = bisect.bisect_right(kind_sizes,
+                                               (time_left - per_file) / per_gb) - 1
+            if position < 0:
+                continue
+            cost = self.model.predict(kind_sizes[position], kind)
+            if cost > best_cost:
+                best, best_cost = (kind, position), cost
+        if best is not None or not first or time_left <= 0:
+            return best
+        cheapest = [(self.model.predict(kind_sizes[0], kind), kind)
+                    for kind, kind_sizes in sizes.items() if kind_sizes]
+        return (min(cheapest)[1], 0) if cheapest else None
+
+    def next_file(self, time_left: float = None) -> Optional[str]:
+        time_left = self.get_time_left() if time_left is None else time_left
+        picked = self._pick(self._sizes, time_left, not self._admitted)
+        if picked is None:
+            return None
+        kind, position = picked
+        file = self._files[kind].pop(position)
+        self._sizes[kind].pop(position)
+        self._started[file] = time.time()
+        self._admitted = True
+        return file
+
+    def complete(self, file: str, elapsed: float = None,
+                 measured: bool = True) -> None:
+        started = self._started.pop(file, None)
+        if elapsed is None and started is not None:
+            elapsed = time.time() - started
+        if measured and elapsed is not None:
+            self.model.record(self._sizes_by_file[file], elapsed,
+                              self._kinds[file])
+
+    def preview(self, time_left: float = None) -> list[str]:
+        time_left = self.get_time_left() if time_left is None else time_left
+        files = {kind: list(kind_files) for kind, kind_files in self._files.items()}
+        sizes = {kind: list(kind_sizes) for kind, kind_sizes in self._sizes.items()}
+        selected = []
+        while True:
+            picked = self._pick(sizes, time_left,
+                                not self._admitted and not selected)
+            if picked is None:
+                return selected
+            kind, position = picked
+            selected.append(files[kind].pop(position))
+            time_left -= self.model.predict(sizes[kind].pop(position), kind)
+
+    @property
+    def remaining_count(self) -> int:
+        return sum(len(kind_files) for kind_files in self._files.values())
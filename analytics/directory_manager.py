@@ -1,6 +1,34 @@
 import os
+import time
+from typing import Iterator
 from analytics.cache_rw import CacheRW
-from analytics.utils import get_files_dict_sizes_gb, sort_files_by_size
+from analytics.batch_planner import plan_runs, prune_plan
+from analytics.metadata_index import Fingerprint
+from analytics.file_inventory import FileInventory
+from analytics.io_scheduler import DeviceQueue
+from analytics.instrumentation import instruments
+
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.webm', '.avi', '.ts',
+                    '.mts', '.m2ts', '.mpg', '.mpeg', '.wmv', '.flv', '.3gp')
+
+def scan_video_files(directory: os.PathLike,
+                     extensions: tuple[str]=VIDEO_EXTENSIONS) -> Iterator[os.DirEntry]:
+    pending_dirs = [directory]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending_dirs.append(entry.path)
+                        elif (entry.is_file()
+                              and entry.name.lower().endswith(extensions)):
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError:
+            continue
 
 class DirectoryMgr:
 
@@ -10,81 +38,127 @@ class DirectoryMgr:
             raise RuntimeError("DirectoryMgr: Directory does not exist.")
         self.directory = directory
         self.cache_obj = cache
+        self.inventory = FileInventory()
+        self.all_files = self.inventory.paths
+        self.run_plan = []
+        self.quarantined_files = []
+
+    def get_relative_path(self, file: os.PathLike) -> str:
+        return file[len(self.directory):]
+
+    def iter_video_files(self) -> Iterator[os.PathLike]:
+        for entry in scan_video_files(self.directory):
+            try:
+                with instruments.timer('stat'):
+                    stat = entry.stat()
+                self.inventory.add(entry.path, stat)
+            except OSError:
+                continue
+            yield entry.path
 
     def get_list_of_files(self,
                           include_full_path: bool=True) -> list[os.PathLike]:
-        file_names = os.listdir(self.directory)
-        self.all_files = [self.directory + file for file in file_names]
+        self.inventory = FileInventory()
+        self.all_files = self.inventory.paths
+        with instruments.timer('scan'):
+            for _ in self.iter_video_files():
+                pass
         self.cache_obj.write_full_files_list(self.all_files)
         if include_full_path:
             return self.all_files
-        return file_names
+        return [self.get_relative_path(file) for file in self.all_files]
+
+    def get_size_gb(self, file: os.PathLike) -> float:
+        return self.inventory.get_size_gb(file)
+
+    def get_fingerprint(self, file: os.PathLike) -> Fingerprint:
+        return self.inventory.get_fingerprint(file)
 
     def get_total_size_gb_of_files(self) -> float:
-        total_size = 0
-        for file in self.all_files:
-            total_size +=  (os.path.getsize(file) / (1024 ** 3))
-        return total_size
+        return self.inventory.total_size_gb
 
     def get_remaining_list_files(self) -> list[os.PathLike]:
-        # self.processed_list = self.cache_obj.read_processed_list()
-        proc_list = []
-        proc_dict_list = self.cache_obj.read_raw_csv_file()
-        for proc in proc_dict_list:
-            proc_list.append(self.directory + proc['file'])
-        self.processed_list = proc_list
-        self.remaining_files = []
-        if self.processed_list:
-            for file in self.all_files:
-                if file not in self.processed_list:
-                    self.remaining_files.append(file)
-        else:
-            self.remaining_files = self.all_files
+        index_fingerprints = self.cache_obj.read_index_fingerprints(self.directory)
+        indexed_by_fingerprint = {fingerprint: path for path, fingerprint
+                                  in index_fingerprints.items()}
+        listed_names = {self.get_relative_path(file) for file in self.all_files}
+        changed_names = set()
+        renamed_names = {}
+        for file in self.all_files:
+            name = self.get_relative_path(file)
+            fingerprint = self.inventory.get_fingerprint(file)
+            indexed_fingerprint = index_fingerprints.get(name)
+            if indexed_fingerprint == fingerprint:
+                self.inventory.mark_processed(file)
+                continue
+            if indexed_fingerprint is not None:
+                changed_names.add(name)
+            old_name = indexed_by_fingerprint.get(fingerprint)
+            if old_name is not None and old_name not in listed_names:
+                renamed_names[old_name] = name
+                self.inventory.mark_processed(file)
+        if changed_names or renamed_names:
+            self.cache_obj.rewrite_history(self.directory, changed_names,
+                                           renamed_names)
+        self.remaining_files = self.skip_quarantined_files(
+            self.inventory.get_remaining_list())
         return self.remaining_files
 
+    def skip_quarantined_files(self, files: list[os.PathLike],
+                               now: float = None) -> list[os.PathLike]:
+        # Files that failed before are only retried once their backoff has
+        # expired, or right away if they changed on disk since.
+        now = time.time() if now is None else now
+        failures = self.cache_obj.read_index_failures(self.directory)
+        self.quarantined_files = []
+        if not failures:
+            return files
+        eligible = []
+        for file in files:
+            failure = failures.get(self.get_relative_path(file))
+            if (failure is not None
+                    and failure[0] == self.inventory.get_fingerprint(file)
+                    and (failure[2] is None or failure[2] > now)):
+                self.quarantined_files.append(file)
+            else:
+                eligible.append(file)
+        return eligible
+
     def get_total_size_gb_of_remaining_files(self) -> float:
-        total_size = 0
-        for file in self.remaining_files:
-            total_size +=  (os.path.getsize(file) / (1024 ** 3))
-        return total_size
+        return self.inventory.remaining_size_gb - self.get_size_gb_of_quarantined_files()
+
+    def get_size_gb_of_quarantined_files(self) -> float:
+        return sum(self.get_size_gb(file) for file in self.quarantined_files)
 
     def get_total_size_gb_of_processed_files(self) -> float:
-        total_size = 0
-        for file in self.processed_list:
-            total_size +=  (os.path.getsize(file) / (1024 ** 3))
-        return total_size
+        return self.inventory.processed_size_gb
 
     def remove_deleted_files(self) -> None:
         pass
 
+    def get_run_plan(self, remaining_list: list[os.PathLike],
+                     size_threshold_gb: float) -> list[list[os.PathLike]]:
+        remaining_sizes = {self.get_relative_path(file): self.get_size_gb(file)
+                           for file in remaining_list}
+        plan = self.cache_obj.read_run_plan()
+        runs = plan.get('runs', [])
+        planned_names = {name for run in runs for name in run}
+        if (plan.get('capacity_gb') != size_threshold_gb
+                or not remaining_sizes.keys() <= planned_names):
+            runs = plan_runs(remaining_sizes, size_threshold_gb)
+        else:
+            runs = prune_plan(runs, remaining_sizes, size_threshold_gb)
+        self.cache_obj.write_run_plan(size_threshold_gb, runs)
+        self.run_plan = [[self.directory + name for name in run] for run in runs]
+        return self.run_plan
+
+    def get_device_queue(self, files: list[os.PathLike],
+                         per_device_limit: int) -> DeviceQueue:
+        return DeviceQueue(files, self.inventory.get_device,
+                           self.inventory.get_inode, self.inventory.get_size,
+                           per_device_limit)
+
     def get_working_batch_list_files(self, remaining_list: list[os.PathLike],
                                     size_threshold_gb: float) -> list[os.PathLike]:
-        if len(remaining_list) <= 1:
-            return remaining_list
-        working_files = []
-        total_size = 0
-        files_dict = sort_files_by_size(get_files_dict_sizes_gb(remaining_list))
-        sorted_names = list(files_dict.keys())
-        left_index = 0
-        right_index = len(sorted_names) - 1
-        while left_index <= right_index:
-            left_file_name = sorted_names[left_index]
-            left_file_size = files_dict[left_file_name]
-            right_file_name = sorted_names[right_index]
-            right_file_size = files_dict[right_file_name]
-            if min(left_file_size, right_file_size) > size_threshold_gb - total_size:
-                break
-            if left_index == right_index:
-                if left_file_size + total_size <= size_threshold_gb:
-                    working_files.append(left_file_name)
-                    total_size += left_file_size
-                break
-            if left_file_size + total_size <= size_threshold_gb:
-                working_files.append(left_file_name)
-                total_size += left_file_size
-                left_index += 1
-            if right_file_size + total_size <= size_threshold_gb:
-                working_files.append(right_file_name)
-                total_size += right_file_size
-                right_index -= 1
-        return working_files
+        run_plan = self.get_run_plan(remaining_list, size_threshold_gb)
+        return run_plan[0] if run_plan else []
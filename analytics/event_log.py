@@ -0,0 +1,64 @@
+import os
+import json
+import time
+from typing import Iterator, Optional
+
+EVENT_LOG_BUFFER_SIZE = 64 * 1024
+
+def get_error_class(error: BaseException) -> str:
+    # get_video_info wraps failures in RuntimeError, the innermost
+    # exception is the one worth clustering on.
+    while error.__context__ is not None:
+        error = error.__context__
+    return type(error).__name__
+
+class EventLog:
+
+    def __init__(self, log_file: os.PathLike, run_id: str = None) -> None:
+        self.log_file = log_file
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S')
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.log_file, 'a', encoding='utf-8',
+                              buffering=EVENT_LOG_BUFFER_SIZE)
+        return self._file
+
+    def log(self, file: str, stage: str, elapsed: Optional[float] = None,
+            **fields) -> None:
+        event = {'ts': time.time(), 'run': self.run_id, 'file': file,
+                 'stage': stage, 'elapsed': elapsed}
+        event.update(fields)
+        self._open().write(json.dumps(event, default=str) + '\n')
+
+    def log_probe(self, file: str, size_mb: float, worker: Optional[int],
+                  stage_times: dict, elapsed: float) -> None:
+        for stage, stage_elapsed in stage_times.items():
+            self.log(file, stage, stage_elapsed, size_mb=size_mb, worker=worker)
+        self.log(file, 'total', elapsed, size_mb=size_mb, worker=worker)
+
+    def log_error(self, file: str, size_mb: float, worker: Optional[int],
+                  stage: str, error_class: str, error: str) -> None:
+        self.log(file, stage, size_mb=size_mb, worker=worker,
+                 error_class=error_class, error=error)
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def iter_events(log_file: os.PathLike) -> Iterator[dict]:
+    if not os.path.exists(log_file):
+        return
+    with open(log_file, encoding='utf-8') as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted run
+                continue
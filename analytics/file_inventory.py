@@ -0,0 +1,97 @@
+import os
+from array import array
+from typing import Optional
+from analytics.metadata_index import Fingerprint
+
+GB = 1024 ** 3
+
+class FileInventory:
+
+    def __init__(self) -> None:
+        self.paths = []
+        self._positions = {}
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.inodes = array('Q')
+        self.devices = array('Q')
+        self._processed = set()
+        self._total_size = 0
+        self._processed_size = 0
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: os.PathLike) -> bool:
+        return path in self._positions
+
+    def add(self, path: os.PathLike, stat_result: os.stat_result) -> None:
+        position = self._positions.get(path)
+        if position is not None:
+            self._total_size -= self.sizes[position]
+            if path in self._processed:
+                self._processed_size -= self.sizes[position]
+            self.sizes[position] = stat_result.st_size
+            self.mtimes[position] = stat_result.st_mtime_ns
+            self.inodes[position] = stat_result.st_ino
+            self.devices[position] = stat_result.st_dev
+        else:
+            self._positions[path] = len(self.paths)
+            self.paths.append(path)
+            self.sizes.append(stat_result.st_size)
+            self.mtimes.append(stat_result.st_mtime_ns)
+            self.inodes.append(stat_result.st_ino)
+            self.devices.append(stat_result.st_dev)
+        self._total_size += stat_result.st_size
+        if path in self._processed:
+            self._processed_size += stat_result.st_size
+
+    def get_size(self, path: os.PathLike) -> int:
+        return self.sizes[self._positions[path]]
+
+    def get_size_gb(self, path: os.PathLike) -> float:
+        return self.get_size(path) / GB
+
+    def get_fingerprint(self, path: os.PathLike) -> Optional[Fingerprint]:
+        position = self._positions.get(path)
+        if position is None:
+            return None
+        return self.sizes[position], self.mtimes[position], self.inodes[position]
+
+    def get_inode(self, path: os.PathLike) -> int:
+        return self.inodes[self._positions[path]]
+
+    def get_device(self, path: os.PathLike) -> int:
+        return self.devices[self._positions[path]]
+
+    def mark_processed(self, path: os.PathLike) -> None:
+        if path in self._processed or path not in self._positions:
+            return
+        self._processed.add(path)
+        self._processed_size += self.get_size(path)
+
+    def get_remaining_list(self) -> list[os.PathLike]:
+        return [path for path in self.paths if path not in self._processed]
+
+    @property
+    def count(self) -> int:
+        return len(self.paths)
+
+    @property
+    def processed_count(self) -> int:
+        return len(self._processed)
+
+    @property
+    def remaining_count(self) -> int:
+        return len(self.paths) - len(self._processed)
+
+    @property
+    def total_size_gb(self) -> float:
+        return self._total_size / GB
+
+    @property
+    def processed_size_gb(self) -> float:
+        return self._processed_size / GB
+
+    @property
+    def remaining_size_gb(self) -> float:
+        return (self._total_size - self._processed_size) / GB
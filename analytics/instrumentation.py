@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import contextlib
+from typing import ContextManager
+
+STAGES = ('scan', 'stat', 'sniff', 'probe', 'summary step', 'csv write',
+          'visualization')
+
+_NULL_TIMER = contextlib.nullcontext()
+
+class Instrumentation:
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.samples = {}
+        self.counters = {}
+
+    def timer(self, stage: str) -> ContextManager:
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timer(stage)
+
+    @contextlib.contextmanager
+    def _timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, elapsed: float) -> None:
+        if self.enabled:
+            self.samples.setdefault(stage, []).append(elapsed)
+
+    def count(self, counter: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def get_stage_stats(self, stage: str) -> dict:
+        samples = sorted(self.samples.get(stage, []))
+        if not samples:
+            return {'count': 0, 'total': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        # Nearest-rank percentiles
+        def percentile(p: float) -> float:
+            return samples[max(0, -(-len(samples) * p // 100) - 1)]
+        return {
+            'count': len(samples),
+            'total': sum(samples),
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'max': samples[-1]
+        }
+
+    def get_stages(self) -> list[str]:
+        return ([stage for stage in STAGES if stage in self.samples]
+                + sorted(stage for stage in self.samples if stage not in STAGES))
+
+    def get_timetable(self) -> dict:
+        timetable = {}
+        for stage in self.get_stages():
+            stats = self.get_stage_stats(stage)
+            timetable[f"{stage.capitalize()} p50 / p95 / max"] = (
+                f"{stats['p50'] * 1000:.2f} / {stats['p95'] * 1000:.2f} / "
+                f"{stats['max'] * 1000:.2f} ms ({stats['count']})")
+        for counter, value in sorted(self.counters.items()):
+            timetable[counter.capitalize()] = value
+        return timetable
+
+    def to_dict(self) -> dict:
+        return {
+            'stages': {stage: self.get_stage_stats(stage)
+                       for stage in self.get_stages()},
+            'counters': dict(self.counters)
+        }
+
+    def write_json(self, json_file: os.PathLike) -> None:
+        with open(json_file, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+instruments = Instrumentation()
+
+def enable_instrumentation(enabled: bool = True) -> Instrumentation:
+    instruments.enabled = enabled
+    return instruments
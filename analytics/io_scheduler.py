@@ -0,0 +1,103 @@
+import os
+from collections import deque
+from typing import Callable, Optional
+from analytics.mp4_handler import SNIFF_WINDOW_SIZE
+from analytics.ts_parser import INITIAL_SAMPLE_SIZE
+
+PREFETCH_SIZE = SNIFF_WINDOW_SIZE
+# A moov box, at either end of the file, holds the sample tables and runs
+# to a few MB for long movies
+MP4_PREFETCH_SIZE = 1024 * 1024
+PREFETCH_SIZES = {
+    **dict.fromkeys(('.mp4', '.m4v', '.mov'), MP4_PREFETCH_SIZE),
+    **dict.fromkeys(('.ts', '.mts', '.m2ts'),
+                    max(PREFETCH_SIZE, INITIAL_SAMPLE_SIZE))
+}
+PREFETCH_DEPTH = 2
+
+def get_prefetch_size(file_path: os.PathLike) -> int:
+    # The encoding sniff reads PREFETCH_SIZE at both ends of every file,
+    # the container parsers may read more.
+    return PREFETCH_SIZES.get(os.path.splitext(file_path)[1].lower(),
+                              PREFETCH_SIZE)
+
+def prefetch_file(file_path: os.PathLike, size: int,
+                  prefetch_size: int = None) -> bool:
+    # Ask the kernel to start reading the byte ranges the probe looks at
+    # first: the head, and the tail where a moov box after mdat or the
+    # last PCR of a transport stream lives.
+    if prefetch_size is None:
+        prefetch_size = get_prefetch_size(file_path)
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.posix_fadvise(fd, 0, prefetch_size, os.POSIX_FADV_WILLNEED)
+        if size > prefetch_size:
+            os.posix_fadvise(fd, max(prefetch_size, size - prefetch_size),
+                             prefetch_size, os.POSIX_FADV_WILLNEED)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+class DeviceQueue:
+
+    def __init__(self, files: list[os.PathLike], get_device: Callable,
+                 get_inode: Callable, get_size: Callable,
+                 per_device_limit: int,
+                 prefetch_depth: int = PREFETCH_DEPTH) -> None:
+        # Files are handed out round-robin over devices, in inode order
+        # within a device, with at most per_device_limit probes in flight
+        # per device.
+        self.per_device_limit = max(1, per_device_limit)
+        self.prefetch_depth = prefetch_depth
+        self._get_size = get_size
+        self._queues = {}
+        for file in sorted(files, key=lambda x: (get_device(x), get_inode(x), x)):
+            self._queues.setdefault(get_device(file), deque()).append(file)
+        self._devices = deque(self._queues)
+        self._in_flight = {device: 0 for device in self._queues}
+        self._file_devices = {}
+        self._prefetched = set()
+        for device in self._devices:
+            self._prefetch(device)
+
+    def _prefetch(self, device: int) -> None:
+        for position, file in enumerate(self._queues[device]):
+            if position >= self.prefetch_depth:
+                break
+            if file not in self._prefetched:
+                self._prefetched.add(file)
+                prefetch_file(file, self._get_size(file))
+
+    def next_file(self) -> Optional[os.PathLike]:
+        for _ in range(len(self._devices)):
+            device = self._devices[0]
+            self._devices.rotate(-1)
+            if (self._queues[device]
+                    and self._in_flight[device] < self.per_device_limit):
+                file = self._queues[device].popleft()
+                self._prefetched.discard(file)
+                self._in_flight[device] += 1
+                self._file_devices[file] = device
+                self._prefetch(device)
+                return file
+        return None
+
+    def complete(self, file: os.PathLike, elapsed: float = None) -> None:
+        device = self._file_devices.pop(file, None)
+        if device is not None:
+            self._in_flight[device] -= 1
+
+    @property
+    def remaining_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def device_count(self) -> int:
+        return len(self._queues)
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import sqlite3
+from typing import Iterable, Optional, Tuple
+
+Fingerprint = Tuple[int, int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    encoding TEXT,
+    size_mb REAL,
+    duration_mins REAL,
+    creation_date TEXT,
+    resolution_h REAL,
+    processing_time REAL
+);
+CREATE INDEX IF NOT EXISTS files_fingerprint ON files (size, mtime_ns, inode);
+CREATE TABLE IF NOT EXISTS failures (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    error_class TEXT,
+    error TEXT,
+    attempts INTEGER,
+    last_attempt REAL,
+    next_attempt REAL
+);
+CREATE TABLE IF NOT EXISTS pending_commit (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    state TEXT
+);
+"""
+
+RETRY_BASE_DELAY = 600.0
+MAX_PROBE_ATTEMPTS = 5
+
+RECORD_COLUMNS = {
+    'encoding': 'encoding',
+    'size (MB)': 'size_mb',
+    'duration (mins)': 'duration_mins',
+    'creation date': 'creation_date',
+    'resolution (h)': 'resolution_h',
+    'processing time': 'processing_time'
+}
+
+TEXT_COLUMNS = {'encoding', 'creation_date'}
+
+def get_fingerprint(stat_result: os.stat_result) -> Fingerprint:
+    return stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino
+
+def get_next_attempt(attempts: int, now: float) -> Optional[float]:
+    # Exponential backoff between runs, None parks the file until it changes
+    if attempts >= MAX_PROBE_ATTEMPTS:
+        return None
+    return now + RETRY_BASE_DELAY * 2 ** (attempts - 1)
+
+def _record_values(record: dict) -> list:
+    values = []
+    for key, column in RECORD_COLUMNS.items():
+        value = record.get(key)
+        if value is not None:
+            value = str(value) if column in TEXT_COLUMNS else float(value)
+        values.append(value)
+    return values
+
+class MetadataIndex:
+
+    def __init__(self, db_file: os.PathLike) -> None:
+        self.db_file = db_file
+        # The checkpoint writer thread takes over the connection once the
+        # main thread is done planning, they never use it at the same time.
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def count(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def get_fingerprints(self) -> dict:
+        rows = self._conn.execute('SELECT path, size, mtime_ns, inode FROM files')
+        return {path: (size, mtime_ns, inode) for path, size, mtime_ns, inode in rows}
+
+    def move_path(self, old_path: str, new_path: str) -> None:
+        with self._conn:
+            self._conn.execute('UPDATE files SET path = ? WHERE path = ?',
+                               (new_path, old_path))
+
+    def delete_paths(self, paths: Iterable[str]) -> None:
+        with self._conn:
+            self._conn.executemany('DELETE FROM files WHERE path = ?',
+                                   [(path,) for path in paths])
+
+    def begin_commit(self, state: dict) -> None:
+        # What to roll the output files back to if the commit doesn't reach
+        # end_commit. It is cleared in the same transaction as the records.
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO pending_commit (id, state) '
+                               'VALUES (0, ?)', (json.dumps(state),))
+
+    def get_pending_commit(self) -> Optional[dict]:
+        row = self._conn.execute('SELECT state FROM pending_commit').fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear_pending_commit(self) -> None:
+        with self._conn:
+            self._conn.execute('DELETE FROM pending_commit')
+
+    def upsert_records(self, records: Iterable[Tuple[str, Optional[Fingerprint],
+                                                     dict]],
+                       end_commit: bool = False) -> None:
+        rows = []
+        for path, fingerprint, record in records:
+            size, mtime_ns, inode = fingerprint or (None, None, None)
+            rows.append((path, size, mtime_ns, inode, *_record_values(record)))
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, '
+                + ', '.join(RECORD_COLUMNS.values()) + ') '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.executemany('DELETE FROM failures WHERE path = ?',
+                                   [(row[0],) for row in rows])
+            if end_commit:
+                self._conn.execute('DELETE FROM pending_commit')
+
+    def get_failures(self) -> dict:
+        rows = self._conn.execute('SELECT path, size, mtime_ns, inode, attempts, '
+                                  'next_attempt FROM failures')
+        return {path: ((size, mtime_ns, inode), attempts, next_attempt)
+                for path, size, mtime_ns, inode, attempts, next_attempt in rows}
+
+    def record_failures(self, failures: Iterable[Tuple[str, Optional[Fingerprint],
+                                                       str, str]],
+                        now: float = None) -> None:
+        now = time.time() if now is None else now
+        rows = []
+        with self._conn:
+            for path, fingerprint, error_class, error in failures:
+                size, mtime_ns, inode = fingerprint or (None, None, None)
+                previous = self._conn.execute(
+                    'SELECT size, mtime_ns, inode, attempts FROM failures '
+                    'WHERE path = ?', (path,)).fetchone()
+                attempts = 1
+                if previous is not None and tuple(previous[:3]) == (size, mtime_ns,
+                                                                    inode):
+                    attempts = previous[3] + 1
+                rows.append((path, size, mtime_ns, inode, error_class, error,
+                             attempts, now, get_next_attempt(attempts, now)))
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO failures (path, size, mtime_ns, inode, '
+                'error_class, error, attempts, last_attempt, next_attempt) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def import_csv_rows(self, raw_rows: Iterable[dict],
+                        directory: os.PathLike) -> int:
+        records = []
+        for row in raw_rows:
+            try:
+                fingerprint = get_fingerprint(os.stat(directory + row['file']))
+            except OSError:
+                fingerprint = None
+            records.append((row['file'], fingerprint, row))
+        self.upsert_records(records)
+        return len(records)
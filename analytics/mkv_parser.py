@@ -0,0 +1,183 @@
+import os
+import struct
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ELEMENT_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_TYPE_ID = 0x83
+VIDEO_ID = 0xE0
+PIXEL_WIDTH_ID = 0xB0
+PIXEL_HEIGHT_ID = 0xBA
+CLUSTER_ID = 0x1F43B675
+VIDEO_TRACK_TYPE = 1
+DEFAULT_TIMECODE_SCALE = 1000000
+MAX_ELEMENTS = 256
+MAX_MASTER_SIZE = 4 * 1024 * 1024
+
+def _read_vint(file: BinaryIO, keep_marker: bool) -> Optional[Tuple[int, int]]:
+    first = file.read(1)
+    if not first:
+        return None
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first[0] & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        return None
+    rest = file.read(length - 1)
+    if len(rest) < length - 1:
+        return None
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        # All ones: unknown size, the element runs to the end of its parent
+        value = -1
+    return value, length
+
+def _iter_elements(file: BinaryIO, start: int,
+                   end: int) -> Iterator[Tuple[int, int, int]]:
+    offset = start
+    for _ in range(MAX_ELEMENTS):
+        if offset >= end:
+            return
+        file.seek(offset)
+        element_id = _read_vint(file, True)
+        element_size = _read_vint(file, False)
+        if element_id is None or element_size is None:
+            return
+        data_start = offset + element_id[1] + element_size[1]
+        data_end = end if element_size[0] < 0 else data_start + element_size[0]
+        if data_end > end:
+            data_end = end
+        yield element_id[0], data_start, data_end
+        offset = data_end
+
+def _read_uint(file: BinaryIO, start: int, end: int) -> int:
+    file.seek(start)
+    return int.from_bytes(file.read(min(end - start, 8)), 'big')
+
+def _read_float(file: BinaryIO, start: int, end: int) -> Optional[float]:
+    file.seek(start)
+    data = file.read(end - start)
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return None
+
+def _parse_info(file: BinaryIO, start: int, end: int) -> Optional[float]:
+    timecode_scale = DEFAULT_TIMECODE_SCALE
+    duration = None
+    for element_id, data_start, data_end in _iter_elements(file, start, end):
+        if element_id == TIMECODE_SCALE_ID:
+            timecode_scale = _read_uint(file, data_start, data_end)
+        elif element_id == DURATION_ID:
+            duration = _read_float(file, data_start, data_end)
+    if duration is None:
+        return None
+    return duration * timecode_scale / 1e9
+
+def _parse_tracks(file: BinaryIO, start: int,
+                  end: int) -> Optional[Tuple[int, int]]:
+    for element_id, data_start, data_end in _iter_elements(file, start, end):
+        if element_id != TRACK_ENTRY_ID:
+            continue
+        track_type = None
+        size = None
+        for child_id, child_start, child_end in _iter_elements(file, data_start,
+                                                               data_end):
+            if child_id == TRACK_TYPE_ID:
+                track_type = _read_uint(file, child_start, child_end)
+            elif child_id == VIDEO_ID:
+                width = height = 0
+                for video_id, video_start, video_end in _iter_elements(
+                        file, child_start, child_end):
+                    if video_id == PIXEL_WIDTH_ID:
+                        width = _read_uint(file, video_start, video_end)
+                    elif video_id == PIXEL_HEIGHT_ID:
+                        height = _read_uint(file, video_start, video_end)
+                size = width, height
+        if track_type == VIDEO_TRACK_TYPE and size and all(size):
+            return size
+    return None
+
+def _parse_seek_head(file: BinaryIO, start: int, end: int,
+                     segment_start: int) -> dict:
+    positions = {}
+    for element_id, data_start, data_end in _iter_elements(file, start, end):
+        if element_id != SEEK_ID:
+            continue
+        seek_id = seek_position = None
+        for child_id, child_start, child_end in _iter_elements(file, data_start,
+                                                               data_end):
+            if child_id == SEEK_ELEMENT_ID:
+                seek_id = _read_uint(file, child_start, child_end)
+            elif child_id == SEEK_POSITION_ID:
+                seek_position = _read_uint(file, child_start, child_end)
+        if seek_id is not None and seek_position is not None:
+            positions[seek_id] = segment_start + seek_position
+    return positions
+
+def _read_master_at(file: BinaryIO, offset: int, file_size: int,
+                    expected_id: int) -> Optional[Tuple[int, int]]:
+    element = next(_iter_elements(file, offset, file_size), None)
+    if element is None or element[0] != expected_id:
+        return None
+    return element[1], element[2]
+
+def parse_mkv_header(file_path: os.PathLike) -> Optional[dict]:
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        if file.read(4) != EBML_MAGIC:
+            return None
+        segment = None
+        for element_id, data_start, data_end in _iter_elements(file, 0, file_size):
+            if element_id == SEGMENT_ID:
+                segment = data_start, data_end
+                break
+        if segment is None:
+            return None
+        duration = size = None
+        seek_positions = {}
+        # Info and Tracks normally come before the first Cluster, when they
+        # don't the SeekHead says where they are.
+        for element_id, data_start, data_end in _iter_elements(file, *segment):
+            if data_end - data_start > MAX_MASTER_SIZE and element_id != CLUSTER_ID:
+                continue
+            if element_id == SEEK_HEAD_ID:
+                seek_positions = _parse_seek_head(file, data_start, data_end,
+                                                  segment[0])
+            elif element_id == INFO_ID:
+                duration = _parse_info(file, data_start, data_end)
+            elif element_id == TRACKS_ID:
+                size = _parse_tracks(file, data_start, data_end)
+            elif element_id == CLUSTER_ID:
+                break
+        if duration is None and INFO_ID in seek_positions:
+            info = _read_master_at(file, seek_positions[INFO_ID], segment[1],
+                                   INFO_ID)
+            if info is not None:
+                duration = _parse_info(file, *info)
+        if size is None and TRACKS_ID in seek_positions:
+            tracks = _read_master_at(file, seek_positions[TRACKS_ID], segment[1],
+                                     TRACKS_ID)
+            if tracks is not None:
+                size = _parse_tracks(file, *tracks)
+    if not duration or not size:
+        return None
+    return {
+        'duration': duration,
+        'width': size[0],
+        'height': size[1]
+    }
@@ -0,0 +1,107 @@
+import os
+import json
+from analytics.column_store import ColumnStore, ColumnTable
+
+METRIC_COLUMNS = {
+    'duration': 'duration (mins)',
+    'size': 'size (MB)',
+    'resolution': 'resolution (h)'
+}
+
+class MonthlyAggregates:
+
+    def __init__(self, months: dict = None, rows: int = 0) -> None:
+        self.months = months or {}
+        self.rows = rows
+
+    def to_dict(self) -> dict:
+        return {'rows': self.rows, 'months': self.months}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'MonthlyAggregates':
+        months = state.get('months', {})
+        # Older files kept a sum of squares next to each total
+        for entry in months.values():
+            for metric in METRIC_COLUMNS:
+                if isinstance(entry[metric], list):
+                    entry[metric] = entry[metric][0]
+        return cls(months, state.get('rows', 0))
+
+    def accumulate_columns(self, table: ColumnTable) -> None:
+        self.rows += len(table)
+        if len(table) == 0:
+            return
+        import numpy as np
+        months = np.asarray(table['creation date']).astype('datetime64[M]')
+        order = np.argsort(months, kind='stable')
+        sorted_months = months[order]
+        starts = np.flatnonzero(np.r_[True, sorted_months[1:] != sorted_months[:-1]])
+        counts = np.diff(np.r_[starts, len(sorted_months)])
+        sums = {}
+        for metric, column in METRIC_COLUMNS.items():
+            values = np.asarray(table[column], dtype=np.float64)[order]
+            sums[metric] = np.add.reduceat(values, starts)
+        for position, month in enumerate(sorted_months[starts]):
+            entry = self.months.setdefault(str(month), {
+                'count': 0,
+                **{metric: 0.0 for metric in METRIC_COLUMNS}
+            })
+            entry['count'] += int(counts[position])
+            for metric, totals in sums.items():
+                entry[metric] += float(totals[position])
+
+    def merge(self, other: 'MonthlyAggregates') -> 'MonthlyAggregates':
+        self.rows += other.rows
+        for month, other_entry in other.months.items():
+            entry = self.months.setdefault(month, {
+                'count': 0,
+                **{metric: 0.0 for metric in METRIC_COLUMNS}
+            })
+            entry['count'] += other_entry['count']
+            for metric in METRIC_COLUMNS:
+                entry[metric] += other_entry[metric]
+        return self
+
+    def to_arrays(self) -> dict:
+        import numpy as np
+        keys = sorted(self.months)
+        counts = np.array([self.months[key]['count'] for key in keys],
+                          dtype=np.int64)
+        arrays = {
+            'months': np.array(keys, dtype='datetime64[M]'),
+            'labels': np.arange(1, len(keys) + 1),
+            'num': counts
+        }
+        for metric in METRIC_COLUMNS:
+            totals = np.array([self.months[key][metric] for key in keys],
+                              dtype=np.float64)
+            arrays[f'total_{metric}'] = totals
+            arrays[f'average_{metric}'] = totals / counts if len(keys) else totals
+        return arrays
+
+def read_monthly_aggregates(aggregates_file: os.PathLike) -> MonthlyAggregates:
+    if not os.path.exists(aggregates_file):
+        return MonthlyAggregates()
+    with open(aggregates_file, encoding='utf-8') as file:
+        return MonthlyAggregates.from_dict(json.load(file))
+
+def write_monthly_aggregates(aggregates_file: os.PathLike,
+                             aggregates: MonthlyAggregates) -> None:
+    tmp_file = aggregates_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        json.dump(aggregates.to_dict(), file)
+    os.replace(tmp_file, aggregates_file)
+
+def update_monthly_aggregates(aggregates_file: os.PathLike,
+                              columns_dir: os.PathLike) -> MonthlyAggregates:
+    # Only the column store rows added since the last update are read.
+    aggregates = read_monthly_aggregates(aggregates_file)
+    store = ColumnStore(columns_dir)
+    store_rows = store.read_meta()['rows']
+    if aggregates.rows == store_rows:
+        return aggregates
+    if aggregates.rows > store_rows:
+        aggregates = MonthlyAggregates()
+    aggregates.accumulate_columns(store.load().slice(aggregates.rows))
+    write_monthly_aggregates(aggregates_file, aggregates)
+    return aggregates
@@ -1,8 +1,11 @@
 import os
 import gc
+import codecs
 import time
 import datetime
-from moviepy.editor import VideoFileClip
+from analytics.container_parsers import parse_header
+
+SNIFF_WINDOW_SIZE = 64 * 1024
 
 class MP4File:
 
@@ -33,44 +36,80 @@ class MP4File:
         self._duration = 0
         self._time_taken = 0
         self._creation_time = 0
+        self._stage_times = {}
 
     def compute_video_info(self) -> None:
         start_time = time.time()
+        probe_time_start = time.perf_counter()
         try:
-            with open(self._file_path, 'r', encoding=self._encoding) as f:
-                _ = f.read()
-            video = VideoFileClip(self._file_path)
-            self._duration = video.duration
             try:
-                self._resolution.set_resolution(res_list=video.size)
+                header = parse_header(self._file_path)
+            except OSError:
+                header = None
+            if header is not None:
+                self._duration = header['duration']
+                res_list = [header['width'], header['height']]
+            else:
+                from moviepy.editor import VideoFileClip
+                video = VideoFileClip(self._file_path)
+                self._duration = video.duration
+                res_list = video.size
+                video.close()
+            try:
+                self._resolution.set_resolution(res_list=res_list)
             except RuntimeError as rte:
                 raise RuntimeError(f"Error in setting resolution: {rte}")
             self._size = os.path.getsize(self._file_path)
             self._creation_time = datetime.datetime.fromtimestamp(os.stat(self._file_path).st_ctime)
+            self._stage_times['probe'] = time.perf_counter() - probe_time_start
             self._time_taken = time.time() - start_time
         except FileNotFoundError:
             raise RuntimeError("Error getting video info: File not found")
+
+def _read_sniff_windows(file_path: os.PathLike,
+                        window_size: int) -> list[bytes]:
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        windows = [file.read(window_size)]
+        if file_size > window_size:
+            file.seek(max(window_size, file_size - window_size))
+            windows.append(file.read(window_size))
+    return windows
+
+def _window_decodes(window: bytes, encoding: str, at_start: bool,
+                    at_end: bool) -> bool:
+    # A window cut out of the middle of a file may start or end inside a
+    # multi-byte sequence, so allow a few bytes of slack on the open edges.
+    start_offsets = [0] if at_start else range(4)
+    for start in start_offsets:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(window[start:], final=at_end)
+            return True
         except UnicodeDecodeError:
-            raise RuntimeError("Error getting video info: Encoding error")
+            continue
+    return False
 
 def get_encoding(file_path: os.PathLike,
-                 encodings: list[str]=['utf-8', 'latin-1']) -> str:
+                 encodings: list[str]=['utf-8', 'latin-1'],
+                 window_size: int=SNIFF_WINDOW_SIZE) -> str:
     if not os.path.exists(file_path):
         raise RuntimeError("File is not found.")
+    windows = _read_sniff_windows(file_path, window_size)
     for encoding in encodings:
-        try:
-            with open(file_path, encoding=encoding) as file:
-                file.read()
+        if all(_window_decodes(window, encoding, index == 0,
+                               index == len(windows) - 1)
+               for index, window in enumerate(windows)):
             return encoding
-        except UnicodeDecodeError:
-            continue
     raise RuntimeError("Can't obtain encoding")
 
 def get_video_info(file_path: os.PathLike) -> dict:
+    sniff_time_start = time.perf_counter()
     try:
         encoding = get_encoding(file_path)
     except RuntimeError as e:
         raise RuntimeError(f"Finding encoding error: {e}")
+    sniff_time = time.perf_counter() - sniff_time_start
     mp4_file = MP4File(file_path, encoding)
     try:
         mp4_file.compute_video_info()
@@ -81,7 +120,8 @@ def get_video_info(file_path: os.PathLike) -> dict:
             'creation_time': mp4_file._creation_time,
             'time_taken': mp4_file._time_taken,
             'resolution_width': mp4_file._resolution.width,
-            'resolution_height': mp4_file._resolution.height
+            'resolution_height': mp4_file._resolution.height,
+            'stage_times': {'sniff': sniff_time, **mp4_file._stage_times}
         }
     except Exception as e:
         raise RuntimeError(f"Error occurred in getting video info: {e}")
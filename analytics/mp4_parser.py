@@ -0,0 +1,145 @@
+import os
+import struct
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+MAX_TOP_LEVEL_BOXES = 64
+MAX_CHILD_BOXES = 256
+
+def _read_box_header(file: BinaryIO, offset: int,
+                     end: int) -> Optional[Tuple[bytes, int, int]]:
+    if offset + 8 > end:
+        return None
+    file.seek(offset)
+    header = file.read(8)
+    if len(header) < 8:
+        return None
+    size, box_type = struct.unpack('>I4s', header)
+    header_size = 8
+    if size == 1:
+        large_size = file.read(8)
+        if len(large_size) < 8:
+            return None
+        size = struct.unpack('>Q', large_size)[0]
+        header_size = 16
+    elif size == 0:
+        size = end - offset
+    if size < header_size or offset + size > end:
+        return None
+    return box_type, offset + header_size, offset + size
+
+def _iter_boxes(file: BinaryIO, start: int, end: int,
+                max_boxes: int) -> Iterator[Tuple[bytes, int, int]]:
+    offset = start
+    for _ in range(max_boxes):
+        box = _read_box_header(file, offset, end)
+        if box is None:
+            return
+        yield box
+        offset = box[2]
+
+def _read_payload(file: BinaryIO, start: int, end: int, length: int) -> bytes:
+    file.seek(start)
+    return file.read(min(length, end - start))
+
+def _parse_time_header(payload: bytes) -> Optional[Tuple[int, int]]:
+    # mvhd and mdhd share the version/timescale/duration layout
+    if len(payload) < 4:
+        return None
+    if payload[0] == 1:
+        if len(payload) < 32:
+            return None
+        timescale, duration = struct.unpack('>IQ', payload[20:32])
+    else:
+        if len(payload) < 20:
+            return None
+        timescale, duration = struct.unpack('>II', payload[12:20])
+    return timescale, duration
+
+def _parse_tkhd(payload: bytes) -> Optional[Tuple[int, int, bool]]:
+    offset = 36 if payload and payload[0] == 1 else 24
+    matrix_offset = offset + 16
+    size_offset = matrix_offset + 36
+    if len(payload) < size_offset + 8:
+        return None
+    matrix_a, matrix_b = struct.unpack('>ii', payload[matrix_offset:matrix_offset + 8])
+    width, height = struct.unpack('>II', payload[size_offset:size_offset + 8])
+    rotated = matrix_a == 0 and matrix_b != 0
+    return width >> 16, height >> 16, rotated
+
+def _parse_stsd(payload: bytes) -> Optional[Tuple[int, int]]:
+    if len(payload) < 44:
+        return None
+    width, height = struct.unpack('>HH', payload[40:44])
+    return width, height
+
+def _parse_trak(file: BinaryIO, start: int, end: int,
+                parent: bytes = b'trak') -> dict:
+    track = {}
+    for box_type, box_start, box_end in _iter_boxes(file, start, end,
+                                                    MAX_CHILD_BOXES):
+        if box_type == b'tkhd':
+            track['tkhd'] = _parse_tkhd(_read_payload(file, box_start,
+                                                      box_end, 96))
+        elif box_type == b'mdhd':
+            track['mdhd'] = _parse_time_header(_read_payload(file, box_start,
+                                                             box_end, 32))
+        elif box_type == b'hdlr' and parent == b'mdia':
+            # QuickTime also has a data handler (alis/url) in minf, only the
+            # media handler tells the track type.
+            payload = _read_payload(file, box_start, box_end, 12)
+            track['handler'] = payload[8:12]
+        elif box_type == b'stsd':
+            track['stsd'] = _parse_stsd(_read_payload(file, box_start,
+                                                      box_end, 44))
+        elif box_type in CONTAINER_BOXES:
+            nested = _parse_trak(file, box_start, box_end, box_type)
+            track.update({k: v for k, v in nested.items() if v is not None})
+    return track
+
+def _find_moov(file: BinaryIO, file_size: int) -> Optional[Tuple[int, int]]:
+    for box_type, box_start, box_end in _iter_boxes(file, 0, file_size,
+                                                    MAX_TOP_LEVEL_BOXES):
+        if box_type == b'moov':
+            return box_start, box_end
+        if not box_type.isascii():
+            return None
+    return None
+
+def parse_mp4_header(file_path: os.PathLike) -> Optional[dict]:
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb', buffering=0) as file:
+        moov = _find_moov(file, file_size)
+        if moov is None:
+            return None
+        movie_header = None
+        tracks = []
+        for box_type, box_start, box_end in _iter_boxes(file, moov[0], moov[1],
+                                                        MAX_CHILD_BOXES):
+            if box_type == b'mvhd':
+                movie_header = _parse_time_header(_read_payload(file, box_start,
+                                                                box_end, 32))
+            elif box_type == b'trak':
+                tracks.append(_parse_trak(file, box_start, box_end))
+    video_tracks = [track for track in tracks if track.get('handler') == b'vide']
+    if not video_tracks:
+        return None
+    video = video_tracks[0]
+    duration = 0
+    if movie_header and movie_header[0]:
+        duration = movie_header[1] / movie_header[0]
+    if not duration and video.get('mdhd') and video['mdhd'][0]:
+        duration = video['mdhd'][1] / video['mdhd'][0]
+    width, height = video.get('stsd') or (0, 0)
+    tkhd = video.get('tkhd')
+    if (not width or not height) and tkhd:
+        width, height = tkhd[0], tkhd[1]
+    if tkhd and tkhd[2]:
+        width, height = height, width
+    if not duration or not width or not height:
+        return None
+    return {
+        'duration': duration,
+        'width': width,
+        'height': height
+    }
@@ -0,0 +1,66 @@
+import queue
+import threading
+from typing import Callable
+
+_STOP = object()
+
+class PipelineError(RuntimeError):
+    pass
+
+class PipelineStage:
+
+    def __init__(self, handler: Callable, workers: int = 1,
+                 max_pending: int = 64, on_idle: Callable = None,
+                 idle_interval: float = None, name: str = 'stage') -> None:
+        # put() blocks once max_pending items are waiting, which throttles
+        # the producer to the speed of this stage.
+        self.handler = handler
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._threads = [threading.Thread(target=self._run, daemon=True,
+                                          name=f'{name}-{i}')
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_interval
+                                       if self.on_idle else None)
+            except queue.Empty:
+                self._call(self.on_idle)
+                continue
+            if item is _STOP:
+                return
+            self._call(self.handler, item)
+
+    def _call(self, function: Callable, *args) -> None:
+        try:
+            function(*args)
+        except Exception as e:
+            self._error = e
+
+    def _raise_error(self) -> None:
+        # Wrapped, so producers can tell a failed stage from their own errors
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise PipelineError(f"{self.name} stage failed: {error}") from error
+
+    def put(self, item) -> None:
+        self._raise_error()
+        self._queue.put(item)
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._raise_error()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
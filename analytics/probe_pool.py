@@ -0,0 +1,245 @@
+import os
+import math
+import time
+import signal
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import Connection, wait as wait_connections
+from typing import Callable, Iterator, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from analytics.mp4_handler import get_video_info
+from analytics.deadline_scheduler import DeadlineScheduler
+from analytics.io_scheduler import DeviceQueue
+from analytics.event_log import get_error_class
+
+ProbeResult = Tuple[os.PathLike, Optional[dict], Optional[str], dict]
+
+MAX_PENDING_RESULTS = 64
+# Probes stopped because the run's execution time ran out, the file is not
+# at fault
+DEADLINE_ERROR_CLASS = 'DeadlineExceeded'
+
+def get_worker_context() -> multiprocessing.context.BaseContext:
+    # Workers, replacements included, are forked from a forkserver: forking
+    # the main process while the checkpoint writer thread holds the sqlite
+    # or stdout lock can deadlock the child.
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['analytics.probe_pool'])
+    return context
+
+WORKER_CONTEXT = get_worker_context()
+
+def probe_file(file_path: os.PathLike) -> ProbeResult:
+    details = {'worker': os.getpid(), 'error_class': None}
+    start_time = time.perf_counter()
+    try:
+        info = get_video_info(file_path)
+        details['elapsed'] = time.perf_counter() - start_time
+        return file_path, info, None, details
+    except Exception as e:
+        details['elapsed'] = time.perf_counter() - start_time
+        details['error_class'] = get_error_class(e)
+        return file_path, None, str(e), details
+
+def _probe_worker(conn: Connection) -> None:
+    # Own process group, so that a timeout also kills the ffmpeg
+    # processes started by the probe.
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    try:
+        while (file_path := conn.recv()) is not None:
+            conn.send(probe_file(file_path))
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+class _WorkerSlot:
+
+    def __init__(self) -> None:
+        self.conn, child_conn = WORKER_CONTEXT.Pipe()
+        self.process = WORKER_CONTEXT.Process(target=_probe_worker,
+                                              args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.file = None
+        self.sequence = 0
+        self.started = 0.0
+        self.timeout = math.inf
+        self.deadline_bound = False
+
+    def submit(self, file_path: os.PathLike, sequence: int = 0,
+               timeout: float = math.inf, deadline_bound: bool = False) -> None:
+        self.conn.send(file_path)
+        self.file = file_path
+        self.sequence = sequence
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.deadline_bound = deadline_bound
+
+    def kill(self) -> None:
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except OSError:
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+def _failed_result(slot: _WorkerSlot, error_class: str, error: str,
+                   elapsed: float) -> ProbeResult:
+    return slot.file, None, error, {'worker': slot.process.pid,
+                                    'error_class': error_class,
+                                    'elapsed': elapsed}
+
+def get_probe_timeout(timeout: Optional[float],
+                      time_left: Callable[[], float] = None) -> Tuple[float, bool]:
+    # The probe timeout, cut down to the time left before the deadline so
+    # that a hung probe can't overrun the execution time.
+    limit = timeout or math.inf
+    if time_left is not None:
+        left = max(time_left(), 0.0)
+        if left < limit:
+            return left, True
+    return limit, False
+
+def probe_supervised(next_file: Callable[[], Optional[os.PathLike]],
+                     workers: int = 1, timeout: float = 120.0,
+                     on_complete: Callable[[ProbeResult], None] = None,
+                     time_left: Callable[[], float] = None
+                     ) -> Iterator[ProbeResult]:
+    # Every probe runs in a worker process that is killed, together with
+    # its children, when it takes longer than the timeout or than the time
+    # left when it was handed out. Results are handed out in submission
+    # order, on_complete sees them as they finish.
+    slots = [_WorkerSlot() for _ in range(max(1, workers))]
+    submitted = 0
+    released = 0
+    finished = {}
+    try:
+        while True:
+            for slot in slots:
+                if slot.file is not None:
+                    continue
+                # Stop feeding workers while a slow probe holds back too
+                # many finished ones.
+                if len(finished) >= MAX_PENDING_RESULTS:
+                    break
+                file = next_file()
+                if file is None:
+                    break
+                slot.submit(file, submitted, *get_probe_timeout(timeout, time_left))
+                submitted += 1
+            busy = [slot for slot in slots if slot.file is not None]
+            if not busy:
+                return
+            wait_time = (min(slot.started + slot.timeout for slot in busy)
+                         - time.monotonic())
+            ready = wait_connections([slot.conn for slot in busy],
+                                     None if wait_time == math.inf
+                                     else max(0.0, wait_time))
+            now = time.monotonic()
+            for position, slot in enumerate(slots):
+                if slot.file is None:
+                    continue
+                sequence = slot.sequence
+                if slot.conn in ready:
+                    try:
+                        result = slot.conn.recv()
+                    except (EOFError, OSError):
+                        result = None
+                    # The replacement worker is forked outside of the except
+                    # block, otherwise it inherits the handled exception.
+                    if result is None:
+                        result = _failed_result(slot, 'WorkerCrashError',
+                                                'Probe worker exited unexpectedly',
+                                                now - slot.started)
+                        slot.kill()
+                        slots[position] = _WorkerSlot()
+                    else:
+                        slot.file = None
+                elif now - slot.started >= slot.timeout:
+                    if slot.deadline_bound:
+                        result = _failed_result(slot, DEADLINE_ERROR_CLASS,
+                                                'Probe stopped at the execution '
+                                                'deadline', now - slot.started)
+                    else:
+                        result = _failed_result(slot, 'TimeoutError',
+                                                f'Probe timed out after {slot.timeout:g} secs',
+                                                now - slot.started)
+                    slot.kill()
+                    slots[position] = _WorkerSlot()
+                else:
+                    continue
+                if on_complete is not None:
+                    on_complete(result)
+                finished[sequence] = result
+            while released in finished:
+                yield finished.pop(released)
+                released += 1
+    finally:
+        for slot in slots:
+            slot.stop()
+
+def complete_probe(scheduler: Union[DeadlineScheduler, DeviceQueue],
+                   result: ProbeResult) -> None:
+    # A probe cut short by the deadline says nothing about the file's cost
+    if result[3]['error_class'] == DEADLINE_ERROR_CLASS:
+        scheduler.complete(result[0], measured=False)
+    else:
+        scheduler.complete(result[0])
+
+def probe_scheduled_files(scheduler: Union[DeadlineScheduler, DeviceQueue],
+                          workers: int = 1,
+                          timeout: float = None) -> Iterator[ProbeResult]:
+    # Deadline runs are always supervised, so no probe outlives the deadline
+    time_left = (scheduler.get_time_left
+                 if isinstance(scheduler, DeadlineScheduler) else None)
+    if timeout or time_left is not None:
+        yield from probe_supervised(scheduler.next_file, workers, timeout,
+                                    lambda result: complete_probe(scheduler, result),
+                                    time_left)
+        return
+    if workers <= 1:
+        while (file := scheduler.next_file()) is not None:
+            start_time = time.time()
+            result = probe_file(file)
+            scheduler.complete(file, time.time() - start_time)
+            yield result
+        return
+    # The scheduler hears about a probe as soon as it finishes, results are
+    # released in submission order.
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=WORKER_CONTEXT) as executor:
+        in_flight = {}
+        submitted = deque()
+        while True:
+            while (len(in_flight) < workers
+                   and len(submitted) - len(in_flight) < MAX_PENDING_RESULTS):
+                file = scheduler.next_file()
+                if file is None:
+                    break
+                future = executor.submit(probe_file, file)
+                in_flight[future] = file
+                submitted.append(future)
+            if not submitted:
+                return
+            if in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scheduler.complete(in_flight.pop(future))
+            while submitted and submitted[0] not in in_flight:
+                yield submitted.popleft().result()
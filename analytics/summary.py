@@ -1,6 +1,19 @@
 import datetime
+from typing import TYPE_CHECKING, Iterable
 from analytics.utils import convert_size_mb_to_str, convert_duration_to_str
 
+if TYPE_CHECKING:
+    from analytics.column_store import ColumnTable
+
+def _break_tie(table: 'ColumnTable', values, index) -> int:
+    # Among the rows holding the extreme, the smallest file name wins, the
+    # same rule merge() and step() apply.
+    import numpy as np
+    candidates = np.flatnonzero(values == values[index])
+    if len(candidates) <= 1:
+        return int(index)
+    return int(min(candidates, key=lambda row: table.get_file_name(int(row))))
+
 class Summary:
 
     def __init__(self) -> None:
@@ -28,22 +41,33 @@ class Summary:
     def step(self, file_name: str, encoding: str, size_mb: float,
              duration_mins: float, creation_date: datetime.datetime,
              time_taken_secs: float) -> None:
-        if size_mb > self.max_size:
+        # Ties go to the smaller file name, like in merge()
+        if (size_mb > self.max_size
+                or size_mb == self.max_size and file_name < self.file_max_size):
             self.max_size = size_mb
             self.file_max_size = file_name
-        if size_mb < self.min_size:
+        if (size_mb < self.min_size
+                or size_mb == self.min_size and file_name < self.file_min_size):
             self.min_size = size_mb
             self.file_min_size = file_name
-        if duration_mins > self.max_duration:
+        if (duration_mins > self.max_duration
+                or duration_mins == self.max_duration
+                and file_name < self.file_max_dur):
             self.max_duration = duration_mins
             self.file_max_dur = file_name
-        if duration_mins < self.min_duration:
+        if (duration_mins < self.min_duration
+                or duration_mins == self.min_duration
+                and file_name < self.file_min_dur):
             self.min_duration = duration_mins
             self.file_min_dur = file_name
-        if self.newest_date is None or creation_date > self.newest_date:
+        if (self.newest_date is None or creation_date > self.newest_date
+                or creation_date == self.newest_date
+                and file_name < self.file_newest_date):
             self.newest_date = creation_date
             self.file_newest_date = file_name
-        if self.oldest_date is None or creation_date < self.oldest_date:
+        if (self.oldest_date is None or creation_date < self.oldest_date
+                or creation_date == self.oldest_date
+                and file_name < self.file_oldest_date):
             self.oldest_date = creation_date
             self.file_oldest_date = file_name
         self.total_duration_mins += duration_mins
@@ -79,71 +103,135 @@ class Summary:
             "---------------\n"
         ]
 
-    def generate_full_summary(self, raw_data_dict: list[dict]) -> list[str]:
-        total_files = len(raw_data_dict)
-        total_size_gb = 0
-        total_duration_mins = 0
-        max_duration = float('-inf')
-        min_duration = float('inf')
-        max_size = float('-inf')
-        min_size = float('inf')
-        oldest_date = None
-        newest_date = None
-        file_max_dur = ""
-        file_max_size = ""
-        file_min_dur = ""
-        file_min_size = ""
-        file_newest_date = ""
-        file_oldest_date = ""
-        total_time_taken = 0
-        avg_size = 0
-        avg_duration = 0
-        avg_time_taken = 0
-        encoding_dict = {}
-        for elm in raw_data_dict:
-            if elm['size (MB)'] > max_size:
-                max_size = elm['size (MB)']
-                file_max_size = elm['file']
-            if elm['size (MB)'] < min_size:
-                min_size = elm['size (MB)']
-                file_min_size = elm['file']
-            if elm['duration (mins)'] > max_duration:
-                max_duration = elm['duration (mins)']
-                file_max_dur = elm['file']
-            if elm['duration (mins)'] < min_duration:
-                min_duration = elm['duration (mins)']
-                file_min_dur = elm['file']
-            if newest_date is None or elm['creation date'] > newest_date:
-                newest_date = elm['creation date'] 
-                file_newest_date = elm['file']
-            if oldest_date is None or elm['creation date']  < oldest_date:
-                oldest_date = elm['creation date'] 
-                file_oldest_date = elm['file']
-            total_size_gb += (elm['size (MB)'] / 1024)
-            total_duration_mins += elm['duration (mins)']
-            total_time_taken += elm['processing time']
-            if elm['encoding'] in encoding_dict:
-                encoding_dict[elm['encoding']] += 1
-            else:
-                encoding_dict[elm['encoding']] = 1
-        avg_size = (total_size_gb / total_files) * 1024
-        avg_duration = total_duration_mins / total_files
-        avg_time_taken = total_time_taken / total_files
+    def to_dict(self) -> dict:
+        state = dict(vars(self))
+        state['encoding_dict'] = dict(self.encoding_dict)
+        for key in ('oldest_date', 'newest_date'):
+            if state[key] is not None:
+                state[key] = str(state[key])
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'Summary':
+        summary = cls()
+        for key, value in state.items():
+            if key in ('oldest_date', 'newest_date') and value is not None:
+                value = datetime.datetime.fromisoformat(value)
+            setattr(summary, key, value)
+        return summary
+
+    @classmethod
+    def from_columns(cls, table: 'ColumnTable') -> 'Summary':
+        summary = cls()
+        summary.accumulate_columns(table)
+        return summary
+
+    def merge(self, other: 'Summary') -> 'Summary':
+        # Ties on an extreme go to the smaller file name, so the merged
+        # state does not depend on the order batches are merged in (totals
+        # up to float rounding).
+        if other.count_files == 0:
+            return self
+        if self.count_files == 0:
+            vars(self).update(Summary.from_dict(other.to_dict()).__dict__)
+            return self
+        for attr, file_attr, keep_greater in (
+                ('max_size', 'file_max_size', True),
+                ('min_size', 'file_min_size', False),
+                ('max_duration', 'file_max_dur', True),
+                ('min_duration', 'file_min_dur', False),
+                ('newest_date', 'file_newest_date', True),
+                ('oldest_date', 'file_oldest_date', False)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            better = theirs > mine if keep_greater else theirs < mine
+            tie_won = (theirs == mine
+                       and getattr(other, file_attr) < getattr(self, file_attr))
+            if better or tie_won:
+                setattr(self, attr, theirs)
+                setattr(self, file_attr, getattr(other, file_attr))
+        self.count_files += other.count_files
+        self.total_time_taken += other.total_time_taken
+        self.total_duration_mins += other.total_duration_mins
+        self.total_size_gb += other.total_size_gb
+        for encoding, count in other.encoding_dict.items():
+            self.encoding_dict[encoding] = self.encoding_dict.get(encoding, 0) + count
+        return self
+
+    def accumulate_columns(self, table: 'ColumnTable') -> None:
+        # Running totals use cumsum, which adds strictly left to right like
+        # step() does, so the printed floats match a row-by-row pass.
+        if len(table) == 0:
+            return
+        import numpy as np
+        sizes = np.asarray(table['size (MB)'])
+        durations = np.asarray(table['duration (mins)'])
+        dates = np.asarray(table['creation date'])
+        for values, attr, file_attr, index in (
+                (sizes, 'max_size', 'file_max_size', np.argmax(sizes)),
+                (sizes, 'min_size', 'file_min_size', np.argmin(sizes)),
+                (durations, 'max_duration', 'file_max_dur', np.argmax(durations)),
+                (durations, 'min_duration', 'file_min_dur', np.argmin(durations))):
+            index = _break_tie(table, values, index)
+            setattr(self, attr, float(values[index]))
+            setattr(self, file_attr, table.get_file_name(index))
+        newest_index = _break_tie(table, dates, np.argmax(dates))
+        oldest_index = _break_tie(table, dates, np.argmin(dates))
+        self.newest_date = dates[newest_index].astype(datetime.datetime)
+        self.file_newest_date = table.get_file_name(newest_index)
+        self.oldest_date = dates[oldest_index].astype(datetime.datetime)
+        self.file_oldest_date = table.get_file_name(oldest_index)
+        self.total_size_gb = float(np.cumsum(sizes / 1024)[-1])
+        self.total_duration_mins = float(np.cumsum(durations)[-1])
+        self.total_time_taken = float(np.cumsum(table['processing time'])[-1])
+        self.count_files = len(table)
+        counts = np.bincount(table['encoding'], minlength=len(table.encodings))
+        self.encoding_dict = {encoding: int(count) for encoding, count
+                              in zip(table.encodings, counts) if count}
+
+    def get_full_summary_lines(self) -> list[str]:
+        if self.count_files == 0:
+            return [
+                "\n",
+                "total files: 0",
+                "\n----------------------------------------------------------------------------\n"
+            ]
+        avg_size = (self.total_size_gb / self.count_files) * 1024
+        avg_duration = self.total_duration_mins / self.count_files
+        avg_time_taken = self.total_time_taken / self.count_files
         return [
             "\n",
-            f"total files: {total_files}",
-            f"max size: {convert_size_mb_to_str(max_size)} -- {file_max_size}",
-            f"min size: {convert_size_mb_to_str(min_size)} -- {file_min_size}",
-            f"max duration: {convert_duration_to_str(max_duration * 60)} -- {file_max_dur}",
-            f"min duration: {convert_duration_to_str(min_duration * 60)} -- {file_min_dur}",
-            f"oldest date: {oldest_date} -- {file_oldest_date}",
-            f"newest date: {newest_date} -- {file_newest_date}",
+            f"total files: {self.count_files}",
+            f"max size: {convert_size_mb_to_str(self.max_size)} -- {self.file_max_size}",
+            f"min size: {convert_size_mb_to_str(self.min_size)} -- {self.file_min_size}",
+            f"max duration: {convert_duration_to_str(self.max_duration * 60)} -- {self.file_max_dur}",
+            f"min duration: {convert_duration_to_str(self.min_duration * 60)} -- {self.file_min_dur}",
+            f"oldest date: {self.oldest_date} -- {self.file_oldest_date}",
+            f"newest date: {self.newest_date} -- {self.file_newest_date}",
             # f"time span of files: {newest_date - oldest_date}",
             f"avg duration: {convert_duration_to_str(avg_duration * 60)}",
             f"avg size: {convert_size_mb_to_str(avg_size)}",
             f"avg processing time (s): {avg_time_taken}",
-            f"avg processing speed (GB/s): {total_size_gb / total_time_taken}",
-            f"total processing time: {convert_duration_to_str(total_time_taken)}",
-            f"encoding(s): {encoding_dict}",
+            f"avg processing speed (GB/s): {self.total_size_gb / self.total_time_taken}",
+            f"total processing time: {convert_duration_to_str(self.total_time_taken)}",
+            f"encoding(s): {self.encoding_dict}",
             "\n----------------------------------------------------------------------------\n"
         ]
+
+    def generate_full_summary_from_columns(self, table: 'ColumnTable') -> list[str]:
+        full_summary = Summary()
+        full_summary.accumulate_columns(table)
+        return full_summary.get_full_summary_lines()
+
+    def generate_full_summary_from_stream(self,
+                                          raw_rows: Iterable[dict]) -> list[str]:
+        full_summary = Summary()
+        for row in raw_rows:
+            full_summary.step(row['file'], row['encoding'], row['size (MB)'],
+                              row['duration (mins)'], row['creation date'],
+                              row['processing time'])
+        return full_summary.get_full_summary_lines()
+
+    def generate_full_summary(self, raw_data_dict: list[dict]) -> list[str]:
+        from analytics.column_store import ColumnTable
+        return self.generate_full_summary_from_columns(
+            ColumnTable.from_rows(raw_data_dict))
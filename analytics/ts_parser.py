@@ -0,0 +1,308 @@
+import os
+from typing import Optional, Tuple
+
+SYNC_BYTE = 0x47
+TS_PACKET_SIZE = 188
+PACKET_SIZES = (188, 192)
+# Samples start small and only grow while the tables, the SPS or a PCR
+# are still missing
+INITIAL_SAMPLE_SIZE = 64 * 1024
+MAX_SAMPLE_SIZE = 1024 * 1024
+SAMPLE_GROWTH = 4
+MIN_SYNC_PACKETS = 3
+PCR_WRAP = 1 << 33
+PCR_CLOCK = 90000
+MAX_ES_BYTES = 256 * 1024
+
+STREAM_TYPE_MPEG1_VIDEO = 0x01
+STREAM_TYPE_MPEG2_VIDEO = 0x02
+STREAM_TYPE_H264 = 0x1B
+VIDEO_STREAM_TYPES = {STREAM_TYPE_MPEG1_VIDEO, STREAM_TYPE_MPEG2_VIDEO,
+                      STREAM_TYPE_H264}
+# Profiles with chroma format and scaling matrix fields in the SPS
+H264_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+def detect_packet_size(data: bytes) -> Optional[Tuple[int, int]]:
+    # Plain TS has 188 byte packets, M2TS prefixes each one with a 4 byte
+    # timestamp.
+    for packet_size in PACKET_SIZES:
+        offset = packet_size - TS_PACKET_SIZE
+        if len(data) < offset + packet_size * MIN_SYNC_PACKETS:
+            continue
+        if all(data[offset + i * packet_size] == SYNC_BYTE
+               for i in range(MIN_SYNC_PACKETS)):
+            return packet_size, offset
+    return None
+
+def _iter_packets(data: bytes, packet_size: int, offset: int):
+    # Resynchronise on the sync byte, the tail sample starts mid-packet
+    position = offset
+    while position + TS_PACKET_SIZE <= len(data):
+        next_position = position + packet_size
+        if data[position] != SYNC_BYTE or (next_position < len(data)
+                                           and data[next_position] != SYNC_BYTE):
+            position = data.find(b'\x47', position + 1)
+            if position < 0:
+                return
+            continue
+        yield data[position:position + TS_PACKET_SIZE]
+        position += packet_size
+
+def _get_pid(packet: bytes) -> int:
+    return ((packet[1] & 0x1F) << 8) | packet[2]
+
+def _get_payload(packet: bytes) -> bytes:
+    adaptation = (packet[3] >> 4) & 0x3
+    if adaptation in (0, 2):
+        return b''
+    if adaptation == 3:
+        return packet[5 + packet[4]:]
+    return packet[4:]
+
+def _get_pcr(packet: bytes) -> Optional[int]:
+    if not (packet[3] >> 4) & 0x2 or packet[4] < 7 or not packet[5] & 0x10:
+        return None
+    return ((packet[6] << 25) | (packet[7] << 17) | (packet[8] << 9)
+            | (packet[9] << 1) | (packet[10] >> 7))
+
+def _get_section(packet: bytes) -> bytes:
+    payload = _get_payload(packet)
+    if not payload or not packet[1] & 0x40:
+        return b''
+    return payload[1 + payload[0]:]
+
+def _parse_pat(section: bytes) -> list[int]:
+    if len(section) < 8:
+        return []
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    end = min(3 + length - 4, len(section))
+    return [((section[i + 2] & 0x1F) << 8) | section[i + 3]
+            for i in range(8, end - 3, 4)
+            if (section[i] << 8) | section[i + 1] != 0]
+
+def _parse_pmt(section: bytes) -> Optional[Tuple[int, int, int]]:
+    if len(section) < 12:
+        return None
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    end = min(3 + length - 4, len(section))
+    pcr_pid = ((section[8] & 0x1F) << 8) | section[9]
+    position = 12 + (((section[10] & 0x0F) << 8) | section[11])
+    while position + 5 <= end:
+        stream_type = section[position]
+        pid = ((section[position + 1] & 0x1F) << 8) | section[position + 2]
+        if stream_type in VIDEO_STREAM_TYPES:
+            return pid, stream_type, pcr_pid
+        position += 5 + (((section[position + 3] & 0x0F) << 8)
+                         | section[position + 4])
+    return None
+
+def _find_video_stream(data: bytes, packet_size: int,
+                       offset: int) -> Optional[Tuple[int, int, int]]:
+    pmt_pids = None
+    for packet in _iter_packets(data, packet_size, offset):
+        pid = _get_pid(packet)
+        if pmt_pids is None and pid == 0:
+            pmt_pids = set(_parse_pat(_get_section(packet)))
+        elif pmt_pids and pid in pmt_pids:
+            stream = _parse_pmt(_get_section(packet))
+            if stream is not None:
+                return stream
+    return None
+
+def _get_elementary_stream(data: bytes, packet_size: int, offset: int,
+                           video_pid: int) -> bytes:
+    chunks = []
+    total = 0
+    started = False
+    for packet in _iter_packets(data, packet_size, offset):
+        if _get_pid(packet) != video_pid:
+            continue
+        payload = _get_payload(packet)
+        if packet[1] & 0x40:
+            # Skip the PES header
+            if len(payload) < 9 or payload[:3] != b'\x00\x00\x01':
+                continue
+            payload = payload[9 + payload[8]:]
+            started = True
+        if started:
+            chunks.append(payload)
+            total += len(payload)
+            if total >= MAX_ES_BYTES:
+                break
+    return b''.join(chunks)
+
+class _BitReader:
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.position = 0
+
+    def read_bits(self, count: int) -> int:
+        value = 0
+        for _ in range(count):
+            byte = self.position >> 3
+            if byte >= len(self.data):
+                raise ValueError("SPS is truncated")
+            value = (value << 1) | ((self.data[byte] >> (7 - (self.position & 7))) & 1)
+            self.position += 1
+        return value
+
+    def read_ue(self) -> int:
+        zeros = 0
+        while self.read_bits(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("Invalid Exp-Golomb code")
+        return (1 << zeros) - 1 + self.read_bits(zeros)
+
+    def read_se(self) -> int:
+        value = self.read_ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+def _remove_emulation_prevention(data: bytes) -> bytes:
+    return data.replace(b'\x00\x00\x03', b'\x00\x00')
+
+def _skip_scaling_list(reader: _BitReader, size: int) -> None:
+    last_scale = next_scale = 8
+    for _ in range(size):
+        if next_scale != 0:
+            next_scale = (last_scale + reader.read_se() + 256) % 256
+        last_scale = next_scale or last_scale
+
+def parse_h264_sps(sps: bytes) -> Tuple[int, int]:
+    reader = _BitReader(_remove_emulation_prevention(sps))
+    profile_idc = reader.read_bits(8)
+    reader.read_bits(16)
+    reader.read_ue()
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    if profile_idc in H264_HIGH_PROFILES:
+        chroma_format_idc = reader.read_ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = reader.read_bits(1)
+        reader.read_ue()
+        reader.read_ue()
+        reader.read_bits(1)
+        if reader.read_bits(1):
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if reader.read_bits(1):
+                    _skip_scaling_list(reader, 16 if i < 6 else 64)
+    reader.read_ue()
+    pic_order_cnt_type = reader.read_ue()
+    if pic_order_cnt_type == 0:
+        reader.read_ue()
+    elif pic_order_cnt_type == 1:
+        reader.read_bits(1)
+        reader.read_se()
+        reader.read_se()
+        for _ in range(reader.read_ue()):
+            reader.read_se()
+    reader.read_ue()
+    reader.read_bits(1)
+    width_in_mbs = reader.read_ue() + 1
+    height_in_map_units = reader.read_ue() + 1
+    frame_mbs_only = reader.read_bits(1)
+    if not frame_mbs_only:
+        reader.read_bits(1)
+    reader.read_bits(1)
+    crop = (0, 0, 0, 0)
+    if reader.read_bits(1):
+        crop = tuple(reader.read_ue() for _ in range(4))
+    if chroma_format_idc == 0 or separate_colour_plane:
+        crop_unit_x, crop_unit_y = 1, 2 - frame_mbs_only
+    else:
+        crop_unit_x = 1 if chroma_format_idc == 3 else 2
+        crop_unit_y = (2 if chroma_format_idc == 1 else 1) * (2 - frame_mbs_only)
+    width = width_in_mbs * 16 - crop_unit_x * (crop[0] + crop[1])
+    height = ((2 - frame_mbs_only) * height_in_map_units * 16
+              - crop_unit_y * (crop[2] + crop[3]))
+    return width, height
+
+def _find_resolution(stream: bytes, stream_type: int) -> Optional[Tuple[int, int]]:
+    if stream_type == STREAM_TYPE_H264:
+        position = stream.find(b'\x00\x00\x01')
+        while position >= 0 and position + 4 < len(stream):
+            if stream[position + 3] & 0x1F == 7:
+                try:
+                    return parse_h264_sps(stream[position + 4:position + 4 + 256])
+                except ValueError:
+                    return None
+            position = stream.find(b'\x00\x00\x01', position + 3)
+        return None
+    position = stream.find(b'\x00\x00\x01\xb3')
+    if position < 0 or position + 7 > len(stream):
+        return None
+    header = stream[position + 4:position + 7]
+    return (header[0] << 4) | (header[1] >> 4), ((header[1] & 0x0F) << 8) | header[2]
+
+def _find_pcr(data: bytes, packet_size: int, offset: int, pcr_pid: int,
+              last: bool) -> Optional[int]:
+    found = None
+    for packet in _iter_packets(data, packet_size, offset):
+        if _get_pid(packet) != pcr_pid:
+            continue
+        pcr = _get_pcr(packet)
+        if pcr is not None:
+            found = pcr
+            if not last:
+                return found
+    return found
+
+def _parse_head(head: bytes, packet_size: int,
+                offset: int) -> Optional[Tuple[int, Tuple[int, int], int]]:
+    stream = _find_video_stream(head, packet_size, offset)
+    if stream is None:
+        return None
+    video_pid, stream_type, pcr_pid = stream
+    resolution = _find_resolution(
+        _get_elementary_stream(head, packet_size, offset, video_pid), stream_type)
+    first_pcr = _find_pcr(head, packet_size, offset, pcr_pid, False)
+    if resolution is None or first_pcr is None:
+        return None
+    return pcr_pid, resolution, first_pcr
+
+def parse_ts_header(file_path: os.PathLike) -> Optional[dict]:
+    # Only samples from the start and from the end of the file are read:
+    # PAT/PMT and the first sequence header give the resolution, the first
+    # and last PCR give the duration. Each sample starts at a few dozen KB
+    # and grows only while what it should hold is missing.
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        head = file.read(INITIAL_SAMPLE_SIZE)
+        packet_format = detect_packet_size(head)
+        if packet_format is None:
+            return None
+        packet_size, offset = packet_format
+        sample_size = INITIAL_SAMPLE_SIZE
+        while (parsed := _parse_head(head, packet_size, offset)) is None:
+            if len(head) < sample_size or sample_size >= MAX_SAMPLE_SIZE:
+                return None
+            sample_size *= SAMPLE_GROWTH
+            head += file.read(sample_size - len(head))
+        pcr_pid, resolution, first_pcr = parsed
+        tail = b''
+        tail_start = file_size
+        sample_size = INITIAL_SAMPLE_SIZE
+        last_pcr = None
+        while tail_start > len(head) and last_pcr is None:
+            previous_start = tail_start
+            tail_start = max(len(head), file_size - sample_size)
+            file.seek(tail_start)
+            tail = file.read(previous_start - tail_start) + tail
+            last_pcr = _find_pcr(tail, packet_size, 0, pcr_pid, True)
+            if sample_size >= MAX_SAMPLE_SIZE:
+                break
+            sample_size *= SAMPLE_GROWTH
+    if last_pcr is None and tail_start <= len(head):
+        # The samples cover the whole file, the last PCR may be in the head
+        last_pcr = _find_pcr(head, packet_size, offset, pcr_pid, True)
+    if last_pcr is None:
+        return None
+    duration = ((last_pcr - first_pcr) % PCR_WRAP) / PCR_CLOCK
+    if not duration or not all(resolution):
+        return None
+    return {
+        'duration': duration,
+        'width': resolution[0],
+        'height': resolution[1]
+    }
@@ -1,7 +1,9 @@
 import os
 import csv
+import datetime
+import itertools
 
-from typing import Union
+from typing import Callable, Iterable, Iterator, Optional, Union
 
 def get_total_size_gb(files_list: list[os.PathLike]) -> float:
     size = 0
@@ -35,24 +37,110 @@ def extract_info_from_file(file_path: os.PathLike,
         else:
             return [line.strip() for line in lines]
 
-def write_file(file: os.PathLike, lines: list[str], mode: str = 'w') -> None:
+def sync_file(file) -> None:
+    file.flush()
+    os.fsync(file.fileno())
+
+def write_file(file: os.PathLike, lines: list[str], mode: str = 'w',
+               sync: bool = False) -> None:
     with open(file, mode, encoding='utf-8') as out_file:
         for i in range(len(lines)):
             line = lines[i] + '\n'
             out_file.write(line)
+        if sync:
+            sync_file(out_file)
 
-def update_csv(data_dict: list[dict], csv_file: os.PathLike,
-               mode: str = 'a') -> None:
-    write_header = True
-    if os.path.exists(csv_file):
-        write_header = False
-    header = list(data_dict[0].keys()) if data_dict else []
-    with open(csv_file, mode, newline='', encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=header)
+CSV_WRITE_BUFFER_SIZE = 1024 * 1024
+
+def parse_datetime(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value)
+
+def parse_int(value: str) -> int:
+    return int(float(value))
+
+RAW_CSV_SCHEMA = {
+    'file': str,
+    'encoding': str,
+    'size (MB)': float,
+    'duration (mins)': float,
+    'creation date': parse_datetime,
+    'resolution (h)': parse_int,
+    'processing time': float
+}
+
+def write_csv_rows(rows: Iterable[dict], csv_file: os.PathLike,
+                   fieldnames: list[str] = None, mode: str = 'a',
+                   sync: bool = False) -> int:
+    rows = iter(rows)
+    if fieldnames is None:
+        first_row = next(rows, None)
+        if first_row is None:
+            return 0
+        fieldnames = list(first_row.keys())
+        rows = itertools.chain([first_row], rows)
+    write_header = (mode == 'w' or not os.path.exists(csv_file)
+                    or os.path.getsize(csv_file) == 0)
+    count = 0
+    with open(csv_file, mode, newline='', encoding="utf-8",
+              buffering=CSV_WRITE_BUFFER_SIZE) as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
         if write_header:
             writer.writeheader()
-        for dic in data_dict:
-            writer.writerow(dic)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        if sync:
+            sync_file(file)
+    return count
+
+def update_csv(data_dict: list[dict], csv_file: os.PathLike,
+               mode: str = 'a', sync: bool = False) -> None:
+    write_csv_rows(data_dict, csv_file, mode=mode, sync=sync)
+
+def iter_csv(csv_file: os.PathLike, schema: dict = None) -> Iterator[dict]:
+    schema = schema or {}
+    with open(csv_file, newline='', encoding="utf-8") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        converters = [schema.get(column, str) for column in header]
+        columns = list(zip(header, converters))
+        # Rows with a missing or unparsable typed cell are skipped, so one
+        # bad legacy row doesn't abort a whole import.
+        skipped = 0
+        first_skipped = None
+        for values in reader:
+            if not values:
+                continue
+            try:
+                if schema and len(values) < len(columns):
+                    raise ValueError("Missing cells")
+                row = {column: convert(value)
+                       for (column, convert), value in zip(columns, values)}
+            except (ValueError, TypeError):
+                skipped += 1
+                first_skipped = first_skipped or reader.line_num
+                continue
+            yield row
+        if skipped:
+            print(f"Warning: skipped {skipped} malformed rows in {csv_file} "
+                  f"(first at line {first_skipped}).")
+
+def rewrite_csv(csv_file: os.PathLike,
+                transform: Callable[[dict], Optional[dict]]) -> None:
+    # Rows are streamed through transform into a temporary file that then
+    # replaces the original, rows mapped to None are dropped.
+    if not os.path.exists(csv_file):
+        return
+    with open(csv_file, newline='', encoding="utf-8") as file:
+        fieldnames = next(csv.reader(file), None)
+    if fieldnames is None:
+        return
+    tmp_file = csv_file + '.tmp'
+    rows = (row for row in map(transform, iter_csv(csv_file)) if row is not None)
+    write_csv_rows(rows, tmp_file, fieldnames, mode='w', sync=True)
+    os.replace(tmp_file, csv_file)
 
 def read_csv(csv_file: os.PathLike) -> list[dict]:
     data = []
@@ -0,0 +1,135 @@
+import re
+import sys
+import argparse
+import statistics
+from tabulate import tabulate
+from analytics.cache_rw import CacheRW
+from analytics.event_log import iter_events
+
+SIZE_BUCKETS_MB = (100, 1024, 4096, 16384)
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Analyze the probe event log')
+    parser.add_argument('--proj', type=str, default="", dest='proj_name',
+                        help='Input project name')
+    parser.add_argument('--run', type=str, default="", dest='run_id',
+                        help='Only analyze this run')
+    parser.add_argument('--top', type=int, default=10, dest='top',
+                        help='Number of slowest files to show')
+    return parser.parse_args()
+
+def get_size_bucket(size_mb: float) -> str:
+    lower = 0
+    for upper in SIZE_BUCKETS_MB:
+        if size_mb < upper:
+            return f'{lower}-{upper} MB'
+        lower = upper
+    return f'>= {lower} MB'
+
+def normalize_error(error: str) -> str:
+    # Group messages that only differ by path or numbers
+    error = re.sub(r"'[^']*'|\"[^\"]*\"", "'...'", error or "")
+    return re.sub(r'\d+', 'N', error)[:120]
+
+def summarize_runs(events: list[dict]) -> list[tuple]:
+    runs = {}
+    for event in events:
+        run = runs.setdefault(event['run'], {'times': [], 'size_mb': 0.0,
+                                             'errors': 0})
+        if event.get('error_class'):
+            run['errors'] += 1
+        elif event['stage'] == 'total':
+            run['times'].append(event['elapsed'])
+            run['size_mb'] += event.get('size_mb') or 0.0
+    rows = []
+    for run_id, run in runs.items():
+        times = sorted(run['times'])
+        total_time = sum(times)
+        rows.append((run_id, len(times), run['errors'],
+                     f"{statistics.median(times):.3f}" if times else '-',
+                     f"{times[max(0, -(-len(times) * 95 // 100) - 1)]:.3f}"
+                     if times else '-',
+                     f"{run['size_mb'] / total_time:.1f}" if total_time else '-'))
+    return rows
+
+def summarize_throughput(events: list[dict]) -> list[tuple]:
+    buckets = {}
+    for event in events:
+        if event['stage'] != 'total' or event.get('error_class'):
+            continue
+        bucket = buckets.setdefault(get_size_bucket(event.get('size_mb') or 0.0),
+                                    {'times': [], 'size_mb': 0.0,
+                                     'lower': event.get('size_mb') or 0.0})
+        bucket['times'].append(event['elapsed'])
+        bucket['size_mb'] += event.get('size_mb') or 0.0
+    rows = []
+    for name, bucket in sorted(buckets.items(), key=lambda x: x[1]['lower']):
+        total_time = sum(bucket['times'])
+        rows.append((name, len(bucket['times']),
+                     f"{statistics.median(bucket['times']):.3f}",
+                     f"{max(bucket['times']):.3f}",
+                     f"{bucket['size_mb'] / total_time:.1f}" if total_time else '-'))
+    return rows
+
+def find_slowest_files(events: list[dict], top: int) -> list[tuple]:
+    totals = [event for event in events
+              if event['stage'] == 'total' and not event.get('error_class')]
+    totals.sort(key=lambda x: -x['elapsed'])
+    stages = {}
+    for event in events:
+        if event['stage'] in ('sniff', 'probe'):
+            stages[(event['run'], event['file'], event['stage'])] = event['elapsed']
+    return [(event['file'], f"{event.get('size_mb') or 0.0:.1f}",
+             f"{event['elapsed']:.4f}",
+             f"{stages.get((event['run'], event['file'], 'sniff'), 0.0):.4f}",
+             f"{stages.get((event['run'], event['file'], 'probe'), 0.0):.4f}",
+             event.get('worker'), event['run'])
+            for event in totals[:top]]
+
+def cluster_errors(events: list[dict]) -> list[tuple]:
+    clusters = {}
+    for event in events:
+        if not event.get('error_class'):
+            continue
+        key = (event['stage'], event['error_class'],
+               normalize_error(event.get('error')))
+        cluster = clusters.setdefault(key, {'count': 0, 'files': set()})
+        cluster['count'] += 1
+        cluster['files'].add(event['file'])
+    return [(stage, error_class, message, cluster['count'], len(cluster['files']),
+             min(cluster['files']))
+            for (stage, error_class, message), cluster
+            in sorted(clusters.items(), key=lambda x: -x[1]['count'])]
+
+def analyze_events(log_file: str, run_id: str = "", top: int = 10) -> None:
+    events = [event for event in iter_events(log_file)
+              if not run_id or event.get('run') == run_id]
+    if not events:
+        print(f"No events in {log_file}")
+        return
+    print("Runs")
+    print(tabulate(summarize_runs(events), tablefmt="pretty",
+                   headers=["Run", "Files", "Errors", "Median (s)", "p95 (s)",
+                            "MB/s"]))
+    print("Throughput by file size")
+    print(tabulate(summarize_throughput(events), tablefmt="pretty",
+                   headers=["Size", "Files", "Median (s)", "Max (s)", "MB/s"]))
+    print("Slowest files")
+    print(tabulate(find_slowest_files(events, top), tablefmt="pretty",
+                   stralign="left",
+                   headers=["File", "Size (MB)", "Total (s)", "Sniff (s)",
+                            "Probe (s)", "Worker", "Run"]))
+    errors = cluster_errors(events)
+    if errors:
+        print("Error clusters")
+        print(tabulate(errors, tablefmt="pretty", stralign="left",
+                       headers=["Stage", "Class", "Message", "Events", "Files",
+                                "Example"]))
+
+def main(args: argparse.Namespace) -> int:
+    analyze_events(CacheRW(args.proj_name, False).event_log_file,
+                   args.run_id, args.top)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(parse_arguments()))
@@ -0,0 +1,233 @@
+import os
+import random
+import struct
+import datetime
+from analytics.utils import write_csv_rows
+from analytics.column_store import ColumnStore
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080), (3840, 2160)]
+ENCODINGS = ['latin-1', 'utf-8']
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+def _full_box(box_type: bytes, payload: bytes) -> bytes:
+    return _box(box_type, b'\0\0\0\0' + payload)
+
+def _identity_matrix() -> bytes:
+    return struct.pack('>9i', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+def build_moov(duration_secs: float, width: int, height: int,
+               timescale: int = 1000) -> bytes:
+    duration = int(duration_secs * timescale)
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', 0, 0, timescale, duration)
+                     + struct.pack('>IH', 0x10000, 0x100) + b'\0' * 10
+                     + _identity_matrix() + b'\0' * 24 + struct.pack('>I', 2))
+    tkhd = _full_box(b'tkhd', struct.pack('>IIIII', 0, 0, 1, 0, duration)
+                     + b'\0' * 16 + _identity_matrix()
+                     + struct.pack('>II', width << 16, height << 16))
+    mdhd = _full_box(b'mdhd', struct.pack('>IIII', 0, 0, timescale, duration)
+                     + b'\0' * 4)
+    hdlr = _full_box(b'hdlr', b'\0' * 4 + b'vide' + b'\0' * 12 + b'video\0')
+    sample_entry = _box(b'avc1', b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 16
+                        + struct.pack('>HH', width, height)
+                        + struct.pack('>II', 0x480000, 0x480000) + b'\0' * 4
+                        + struct.pack('>H', 1) + b'\0' * 32
+                        + struct.pack('>Hh', 0x18, -1))
+    stsd = _full_box(b'stsd', struct.pack('>I', 1) + sample_entry)
+    stbl = _box(b'stbl', stsd)
+    minf = _box(b'minf', stbl)
+    mdia = _box(b'mdia', mdhd + hdlr + minf)
+    trak = _box(b'trak', tkhd + mdia)
+    return _box(b'moov', mvhd + trak)
+
+def write_mp4(file_path: os.PathLike, duration_secs: float, width: int,
+              height: int, size_bytes: int = 0, moov_at_end: bool = False) -> None:
+    # The mdat payload is a hole, so large files are sparse and cheap to make.
+    ftyp = _box(b'ftyp', b'isom' + struct.pack('>I', 0x200) + b'isomiso2avc1mp41')
+    moov = build_moov(duration_secs, width, height)
+    mdat_size = max(size_bytes - len(ftyp) - len(moov), 16)
+    mdat_header = struct.pack('>I4sQ', 1, b'mdat', mdat_size)
+    with open(file_path, 'wb') as file:
+        file.write(ftyp)
+        if moov_at_end:
+            file.write(mdat_header)
+            file.seek(len(ftyp) + mdat_size)
+            file.write(moov)
+        else:
+            file.write(moov)
+            file.write(mdat_header)
+            file.truncate(len(ftyp) + len(moov) + mdat_size)
+
+def _ebml_element(element_id: int, payload: bytes) -> bytes:
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+    return id_bytes + (0x01 << 56 | len(payload)).to_bytes(8, 'big') + payload
+
+def _ebml_uint(element_id: int, value: int) -> bytes:
+    return _ebml_element(element_id, value.to_bytes(8, 'big'))
+
+def write_mkv(file_path: os.PathLike, duration_secs: float, width: int,
+              height: int, size_bytes: int = 0) -> None:
+    header = _ebml_element(0x1A45DFA3, _ebml_element(0x4282, b'matroska'))
+    info = _ebml_element(0x1549A966, _ebml_uint(0x2AD7B1, 1000000)
+                         + _ebml_element(0x4489, struct.pack('>d',
+                                                             duration_secs * 1000)))
+    video = _ebml_element(0xE0, _ebml_uint(0xB0, width) + _ebml_uint(0xBA, height))
+    tracks = _ebml_element(0x1654AE6B, _ebml_element(
+        0xAE, _ebml_uint(0xD7, 1) + _ebml_uint(0x83, 1)
+        + _ebml_element(0x86, b'V_MPEG4/ISO/AVC') + video))
+    segment_start = len(header) + 12
+    cluster_size = max(size_bytes - segment_start - len(info) - len(tracks) - 12, 0)
+    with open(file_path, 'wb') as file:
+        # Unknown-size Segment, as written by live muxers
+        file.write(header + b'\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff')
+        file.write(info + tracks)
+        file.write(b'\x1f\x43\xb6\x75'
+                   + (0x01 << 56 | cluster_size).to_bytes(8, 'big'))
+        file.truncate(file.tell() + cluster_size)
+
+def write_avi(file_path: os.PathLike, duration_secs: float, width: int,
+              height: int, size_bytes: int = 0, fps: int = 25) -> None:
+    frames = int(duration_secs * fps)
+    avih = _riff_chunk(b'avih', struct.pack('<14I', 1000000 // fps, 0, 0, 0x10,
+                                            frames, 0, 1, 0, width, height,
+                                            0, 0, 0, 0))
+    strh = _riff_chunk(b'strh', b'vids' + b'H264' + struct.pack(
+        '<IHHIIIIIIIIhhhh', 0, 0, 0, 0, 1, fps, 0, frames, 0, 0xFFFFFFFF, 0,
+        0, 0, width, height))
+    strf = _riff_chunk(b'strf', struct.pack('<IiiHH4sIiiII', 40, width, height,
+                                            1, 24, b'H264', 0, 0, 0, 0, 0))
+    hdrl = _riff_chunk(b'LIST', b'hdrl' + avih + _riff_chunk(b'LIST', b'strl'
+                                                             + strh + strf))
+    movi_size = max(min(size_bytes, 0xFFFFFFF0) - len(hdrl) - 20, 4)
+    with open(file_path, 'wb') as file:
+        file.write(b'RIFF' + struct.pack('<I', 4 + len(hdrl) + 8 + movi_size)
+                   + b'AVI ' + hdrl)
+        file.write(b'LIST' + struct.pack('<I', movi_size) + b'movi')
+        file.truncate(file.tell() + movi_size - 4)
+
+def _riff_chunk(chunk_id: bytes, payload: bytes) -> bytes:
+    return chunk_id + struct.pack('<I', len(payload)) + payload
+
+def _exp_golomb(value: int) -> str:
+    bits = bin(value + 1)[2:]
+    return '0' * (len(bits) - 1) + bits
+
+def build_h264_sps(width: int, height: int) -> bytes:
+    width_mbs = (width + 15) // 16
+    height_mbs = (height + 15) // 16
+    crop_bottom = (height_mbs * 16 - height) // 2
+    bits = ('01000010' + '00000000' + '00101000' + _exp_golomb(0)
+            + _exp_golomb(0) + _exp_golomb(2) + _exp_golomb(1) + '0'
+            + _exp_golomb(width_mbs - 1) + _exp_golomb(height_mbs - 1)
+            + '1' + '1')
+    if crop_bottom:
+        bits += '1' + _exp_golomb(0) * 3 + _exp_golomb(crop_bottom)
+    else:
+        bits += '0'
+    bits += '0' + '1'
+    bits += '0' * (-len(bits) % 8)
+    return b'\x67' + int(bits, 2).to_bytes(len(bits) // 8, 'big')
+
+def _ts_packet(pid: int, payload: bytes, start: bool = False,
+               pcr: int = None) -> bytes:
+    adaptation = b''
+    if pcr is not None:
+        adaptation = bytes([0x10]) + struct.pack('>IH', pcr >> 1,
+                                                 ((pcr & 1) << 15) | 0x7E00)
+    stuffing = 184 - len(payload) - (len(adaptation) + 1 if pcr is not None else 0)
+    if pcr is not None or stuffing > 0:
+        adaptation = adaptation + b'\xff' * max(stuffing - (0 if pcr is not None
+                                                             else 1), 0)
+        control = 0x30
+        adaptation = bytes([len(adaptation)]) + adaptation
+    else:
+        control = 0x10
+    return (bytes([0x47, (0x40 if start else 0) | (pid >> 8), pid & 0xFF,
+                   control]) + adaptation + payload)
+
+def _psi_section(table_id: int, body: bytes) -> bytes:
+    section = bytes([table_id]) + struct.pack('>H', 0xB000 | (len(body) + 9))
+    return b'\x00' + section + b'\x00\x01\xc1\x00\x00' + body + b'\x00' * 4
+
+def write_ts(file_path: os.PathLike, duration_secs: float, width: int,
+             height: int, size_bytes: int = 0) -> None:
+    video_pid, pmt_pid = 0x100, 0x1000
+    pat = _ts_packet(0, _psi_section(0x00, struct.pack('>HH', 1,
+                                                       0xE000 | pmt_pid)), True)
+    pmt = _ts_packet(pmt_pid, _psi_section(0x02, struct.pack(
+        '>HHBHH', 0xE000 | video_pid, 0xF000, 0x1B, 0xE000 | video_pid, 0xF000)),
+        True)
+    pes = (b'\x00\x00\x01\xe0\x00\x00\x80\x00\x00' + b'\x00\x00\x00\x01'
+           + build_h264_sps(width, height))
+    head = pat + pmt + _ts_packet(video_pid, pes, True, pcr=0)
+    tail = _ts_packet(video_pid, b'', pcr=int(duration_secs * 90000))
+    packets = max(size_bytes // 188, 8)
+    with open(file_path, 'wb') as file:
+        file.write(head)
+        # Null packets in between, the middle of the file is never read
+        file.write(_ts_packet(0x1FFF, b'') * 4)
+        file.seek((packets - 1) * 188)
+        file.write(tail)
+
+CONTAINER_WRITERS = {
+    'mp4': write_mp4,
+    'mkv': write_mkv,
+    'avi': write_avi,
+    'ts': write_ts
+}
+
+def generate_library(directory: os.PathLike, count: int, seed: int = 0,
+                     min_size_mb: float = 1, max_size_mb: float = 4096,
+                     subdirs: int = 0,
+                     formats: tuple[str] = ('mp4',)) -> list[str]:
+    rng = random.Random(seed)
+    files = []
+    for index in range(count):
+        sub_dir = directory
+        if subdirs:
+            sub_dir = os.path.join(directory, f'dir_{index % subdirs:03d}')
+        os.makedirs(sub_dir, exist_ok=True)
+        # Only draw when there is a choice, so mp4-only corpora keep the
+        # same seeded stream as before
+        container = rng.choice(formats) if len(formats) > 1 else formats[0]
+        file_path = os.path.join(sub_dir, f'movie_{index:07d}.{container}')
+        width, height = rng.choice(RESOLUTIONS)
+        duration = rng.uniform(30, 3 * 3600)
+        size_bytes = int(rng.uniform(min_size_mb, max_size_mb) * 1024 ** 2)
+        if container == 'mp4':
+            write_mp4(file_path, duration, width, height, size_bytes,
+                      moov_at_end=rng.random() < 0.5)
+        else:
+            CONTAINER_WRITERS[container](file_path, duration, width, height,
+                                         size_bytes)
+        files.append(file_path)
+    return files
+
+def generate_raw_rows(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    start = datetime.datetime(2015, 1, 1)
+    rows = []
+    for index in range(count):
+        rows.append({
+            "file": f'movie_{index:07d}.mp4',
+            "encoding": rng.choice(ENCODINGS),
+            "size (MB)": rng.uniform(1, 8192),
+            "duration (mins)": rng.uniform(0.5, 180),
+            "creation date": start + datetime.timedelta(
+                seconds=rng.randint(0, 10 * 365 * 24 * 3600),
+                microseconds=rng.randint(0, 999999)),
+            "resolution (h)": rng.choice(RESOLUTIONS)[1],
+            "processing time": rng.uniform(0.001, 2)
+        })
+    return rows
+
+def generate_raw_history(report_dir: os.PathLike, count: int, seed: int = 0,
+                         with_columns: bool = True) -> str:
+    os.makedirs(report_dir, exist_ok=True)
+    csv_file = os.path.join(report_dir, 'files_raw.csv')
+    rows = generate_raw_rows(count, seed)
+    write_csv_rows(rows, csv_file, mode='w')
+    if with_columns:
+        ColumnStore(os.path.join(report_dir, 'columns')).append_rows(rows)
+    return csv_file
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import importlib.util
+from benchmarks.corpus import generate_library, generate_raw_history
+from analytics.cache_rw import CacheRW
+from analytics.directory_manager import DirectoryMgr
+from analytics.mp4_handler import get_video_info
+from analytics.summary import Summary
+from analytics.column_store import ColumnStore
+from analytics.monthly_aggregates import update_monthly_aggregates
+from analytics.utils import iter_csv, RAW_CSV_SCHEMA
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark movie analytics stages')
+    parser.add_argument('--library-scales', type=str, default='100,1000',
+                        dest='library_scales',
+                        help='Comma separated synthetic library sizes (files)')
+    parser.add_argument('--history-scales', type=str, default='1000,10000,100000',
+                        dest='history_scales',
+                        help='Comma separated synthetic history sizes (rows)')
+    parser.add_argument('--repeat', type=int, default=3, dest='repeat',
+                        help='Repetitions per stage, the best one is kept')
+    parser.add_argument('--out', type=str, default='bench_results.json',
+                        dest='out_file', help='JSON results file')
+    parser.add_argument('--work-dir', type=str, default="", dest='work_dir',
+                        help='Where synthetic data is generated')
+    parser.add_argument('--formats', type=str, default='mp4', dest='formats',
+                        help='Comma separated containers in the synthetic '
+                             'library (mp4, mkv, avi, ts)')
+    return parser.parse_args()
+
+def time_stage(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def bench_library(work_dir: os.PathLike, count: int, repeat: int,
+                  formats: tuple[str] = ('mp4',)) -> dict:
+    library_dir = os.path.join(work_dir, f'library_{count}') + os.sep
+    files = generate_library(library_dir, count, subdirs=max(1, count // 500),
+                             formats=formats)
+    cache_dir = os.path.join(work_dir, f'cache_{count}') + os.sep
+
+    def scan():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        dir_mgr = DirectoryMgr(library_dir,
+                               CacheRW('bench', False, proj_cache_dir=cache_dir))
+        dir_mgr.get_list_of_files()
+        dir_mgr.get_remaining_list_files()
+
+    def probe():
+        for file in files:
+            get_video_info(file)
+
+    return {
+        'files': count,
+        'formats': list(formats),
+        'scan_secs': time_stage(scan, repeat),
+        'probe_secs': time_stage(probe, repeat)
+    }
+
+def bench_history(work_dir: os.PathLike, count: int, repeat: int) -> dict:
+    report_dir = os.path.join(work_dir, f'history_{count}') + os.sep
+    csv_file = generate_raw_history(report_dir, count)
+    columns_dir = os.path.join(report_dir, 'columns')
+    aggregates_file = os.path.join(report_dir, 'monthly_aggregates.json')
+
+    def summary_columns():
+        Summary().generate_full_summary_from_columns(ColumnStore(columns_dir).load())
+
+    def summary_stream():
+        Summary().generate_full_summary_from_stream(iter_csv(csv_file,
+                                                             RAW_CSV_SCHEMA))
+
+    def monthly_aggregates():
+        if os.path.exists(aggregates_file):
+            os.remove(aggregates_file)
+        update_monthly_aggregates(aggregates_file, columns_dir)
+
+    results = {
+        'rows': count,
+        'summary_columns_secs': time_stage(summary_columns, repeat),
+        'summary_stream_secs': time_stage(summary_stream, repeat),
+        'monthly_aggregates_secs': time_stage(monthly_aggregates, repeat)
+    }
+    if importlib.util.find_spec('matplotlib') is not None:
+        from visualization import generate_visualization
+        results['visualization_secs'] = time_stage(
+            lambda: generate_visualization(report_dir, 'files_raw.csv'), 1)
+    return results
+
+def main(args: argparse.Namespace) -> int:
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='movie_analytics_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    results = {
+        'commit': get_git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'library': [],
+        'history': []
+    }
+    formats = tuple(x for x in args.formats.split(',') if x)
+    try:
+        for count in [int(x) for x in args.library_scales.split(',') if x]:
+            results['library'].append(bench_library(work_dir, count, args.repeat,
+                                                     formats))
+            print(results['library'][-1])
+        for count in [int(x) for x in args.history_scales.split(',') if x]:
+            results['history'].append(bench_history(work_dir, count, args.repeat))
+            print(results['history'][-1])
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    with open(args.out_file, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.out_file}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(parse_arguments()))
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import importlib.util
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['numpy', 'moviepy.editor', 'matplotlib.pyplot', 'tkinter']
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark startup time')
+    parser.add_argument('--runs', type=int, default=10, dest='runs',
+                        help='Number of interpreter launches per case')
+    parser.add_argument('--json', type=str, default="", dest='json_file',
+                        help='Write results to this JSON file')
+    return parser.parse_args()
+
+def is_available(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+def time_import(statement: str, runs: int) -> list[float]:
+    code = ("import time; start = time.perf_counter(); "
+            f"{statement}; print(time.perf_counter() - start)")
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return timings
+
+def main(args: argparse.Namespace) -> int:
+    heavy_modules = [module for module in HEAVY_MODULES if is_available(module)]
+    cases = {
+        'main_v3 (lazy)': 'import main_v3',
+        'main_v3 + heavy deps (eager equivalent)':
+            '; '.join(['import main_v3']
+                      + [f'import {module}' for module in heavy_modules]),
+        'visualization (lazy)': 'import visualization'
+    }
+    results = {}
+    for name, statement in cases.items():
+        timings = time_import(statement, args.runs)
+        results[name] = {
+            'median_secs': statistics.median(timings),
+            'min_secs': min(timings),
+            'max_secs': max(timings),
+            'runs': args.runs
+        }
+    print(f"heavy modules measured: {heavy_modules or 'none installed'}")
+    print("{:<45} {:<12} {:<12}".format("Case", "Median (s)", "Min (s)"))
+    print("-" * 69)
+    for name, result in results.items():
+        print("{:<45} {:<12} {:<12}".format(name, f"{result['median_secs']:.4f}",
+                                           f"{result['min_secs']:.4f}"))
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as file:
+            json.dump({'heavy_modules': heavy_modules, 'results': results},
+                      file, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(parse_arguments()))
@@ -14,7 +14,7 @@ def display_progress(total_count: int,
                      processed_count: int,
                      progress_text: str) -> None:
     progress_bar = ['-'] * 100
-    for i in range(int(processed_count * 100 / total_count)):
+    for i in range(min(100, int(processed_count * 100 / total_count))):
         progress_bar[i] = '+'
     print(f"{''.join(progress_bar)}\t\t"
           f"{progress_text}")
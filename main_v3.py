@@ -2,6 +2,7 @@ import os
 import gc
 import sys
 import math
+import contextlib
 import time
 import queue
 import argparse
@@ -9,13 +10,18 @@ import threading
 from typing import Tuple
 from analytics.summary import Summary
 from analytics.cache_rw import CacheRW
+from analytics.checkpoint import CheckpointWriter
+from analytics.pipeline import PipelineError
+from analytics.event_log import EventLog, get_error_class
+from analytics.monthly_aggregates import update_monthly_aggregates
 from analytics.directory_manager import DirectoryMgr
-from analytics.mp4_handler import get_video_info
-from visualization import generate_visualization
-from ui import get_user_inputs, show_progress_window
+from analytics.probe_pool import probe_scheduled_files, DEADLINE_ERROR_CLASS
+from analytics.deadline_scheduler import CostModel, DeadlineScheduler
+from analytics.container_parsers import is_native_format
+from analytics.io_scheduler import DeviceQueue
+from analytics.instrumentation import instruments, enable_instrumentation
 from cli_displayers import display_progress, display_table
-from analytics.utils import (get_total_size_gb,
-                             convert_duration_to_str,
+from analytics.utils import (convert_duration_to_str,
                              convert_size_to_str,
                              convert_resolution_to_str,
                              convert_size_mb_to_str)
@@ -36,6 +42,27 @@ def parse_arguments() -> argparse.Namespace:
                         help='Hide detailed output')
     parser.add_argument('--ui', action='store_true', dest='use_ui',
                         help='Use the UI')
+    parser.add_argument('--workers', type=int, default=1, dest='workers',
+                        help='Number of parallel probing processes')
+    parser.add_argument('--deadline', action='store_true', dest='deadline',
+                        help='Pick files until the execution time runs out '
+                             'instead of pre-sizing the batch')
+    parser.add_argument('--probe-timeout', type=float, default=120,
+                        dest='probe_timeout',
+                        help='Seconds before a probe is killed and the file '
+                             'recorded as timed out (0 disables)')
+    parser.add_argument('--per-device-workers', type=int, default=None,
+                        dest='per_device_workers',
+                        help='Maximum parallel probes on the same device, '
+                             'also caps --ffprobe (default: the number of '
+                             'workers)')
+    parser.add_argument('--ffprobe', action='store_true', dest='use_ffprobe',
+                        help='Probe with asyncio-driven ffprobe subprocesses '
+                             'instead of moviepy when the native parser fails')
+    parser.add_argument('--instrument', action='store_true', dest='instrument',
+                        help='Report per-stage timing percentiles')
+    parser.add_argument('--profile', action='store_true', dest='profile',
+                        help='Dump a cProfile of the run to the project out directory')
     return parser.parse_args()
 
 def process_args(args: argparse.Namespace) -> Tuple[os.PathLike, str,
@@ -50,7 +77,13 @@ def process_args(args: argparse.Namespace) -> Tuple[os.PathLike, str,
             dest_dir += separator
         max_size_batch = proc_speed * (max_exec_time - 10)
         verbose = not quiet_mode
-        return dest_dir, proj_name, separator, max_size_batch, proc_speed, verbose, args.use_ui
+        return (dest_dir, proj_name, separator, max_size_batch, proc_speed,
+                verbose, args.use_ui, max(1, args.workers),
+                max_exec_time if args.deadline else None,
+                args.instrument or args.profile,
+                args.probe_timeout if args.probe_timeout > 0 else None,
+                max(1, args.per_device_workers or args.workers),
+                args.use_ffprobe)
 
     defaults_dict = {}
 
@@ -64,6 +97,7 @@ def process_args(args: argparse.Namespace) -> Tuple[os.PathLike, str,
     defaults_dict['exec_time'] = str(int(args.max_exec_time))
 
     if args.use_ui:
+        from ui import get_user_inputs
         user_inputs = get_user_inputs(defaults_dict)
         dest_dir = user_inputs['destination']
         proj_name = user_inputs['project_name']
@@ -80,9 +114,30 @@ def process_args(args: argparse.Namespace) -> Tuple[os.PathLike, str,
     return prepare_values(dest_dir, proj_name, proc_speed,
                           exec_time, quiet_mode)
 
+def update_history_summary(cache_obj: CacheRW) -> Summary:
+    state = cache_obj.read_summary_state()
+    covered_rows = state.get('rows', 0)
+    if state and covered_rows == cache_obj.read_raw_columns_count():
+        return Summary.from_dict(state['summary'])
+    raw_columns = cache_obj.read_raw_columns()
+    if not state or covered_rows > len(raw_columns):
+        history = Summary()
+        covered_rows = 0
+    else:
+        history = Summary.from_dict(state['summary'])
+    history.merge(Summary.from_columns(raw_columns.slice(covered_rows)))
+    cache_obj.write_summary_state({'rows': len(raw_columns),
+                                   'summary': history.to_dict()})
+    return history
+
 def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
          max_size_batch: float, proc_speed: float,
-         verbose: bool, use_ui: bool) -> int:
+         verbose: bool, use_ui: bool, workers: int = 1,
+         deadline_secs: float = None, instrument: bool = False,
+         probe_timeout: float = None, per_device_workers: int = None,
+         use_ffprobe: bool = False) -> int:
+    per_device_workers = per_device_workers or workers
+    enable_instrumentation(instrument)
     start_time = time.time()
     initialization_time_start = time.time()
     cache_obj = CacheRW(proj_name, verbose)
@@ -93,21 +148,59 @@ def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
     remaining_list = dir_mgr_obj.get_remaining_list_files()
     remaining_list_size = dir_mgr_obj.get_total_size_gb_of_remaining_files()
     processed_list_size = dir_mgr_obj.get_total_size_gb_of_processed_files()
+    if verbose and dir_mgr_obj.quarantined_files:
+        print(f"{len(dir_mgr_obj.quarantined_files)} previously failed files "
+              "are skipped until they change or their retry delay expires.")
     if len(remaining_list) == 0:
-        raw_csv_data = cache_obj.read_raw_csv_file()
-        full_summary = summary_obj.generate_full_summary(raw_csv_data)
+        full_summary = update_history_summary(cache_obj).get_full_summary_lines()
         cache_obj.write_full_summary_file(full_summary)
         path_name, file_name = os.path.split(cache_obj.csv_raw_file)
-        generate_visualization(path_name + '/', file_name)
+        from visualization import generate_visualization
+        with instruments.timer('visualization'):
+            generate_visualization(path_name + '/', file_name, only_if_changed=True)
+        if instrument:
+            instruments.write_json(cache_obj.instrumentation_file)
         return 0
-    working_list = dir_mgr_obj.get_working_batch_list_files(remaining_list,
-                                                            max_size_batch)
-    actual_processed = []
-    total_size_gb = get_total_size_gb(working_list)
+    if deadline_secs is not None:
+        cost_model = CostModel(cache_obj.read_perf_model())
+        scheduler = DeadlineScheduler({file: dir_mgr_obj.get_size_gb(file)
+                                       for file in remaining_list},
+                                      time.time() + deadline_secs, cost_model,
+                                      is_native_format)
+        working_list = scheduler.preview()
+        if len(working_list) == 0:
+            # Only when the execution time doesn't cover the finalization
+            # reserve, the cheapest file is admitted otherwise
+            print("No file fits in the execution time: "
+                  f"{deadline_secs:g} secs leave nothing after the "
+                  f"{cost_model.get_finalization_reserve():.1f} secs "
+                  "finalization reserve.")
+            return 0
+        run_window = max(1, deadline_secs - cost_model.get_finalization_reserve())
+        expected_remaining_runs = math.ceil(
+            sum(scheduler.predict(file) for file in remaining_list) / run_window)
+        probe_queue = scheduler
+    else:
+        working_list = dir_mgr_obj.get_working_batch_list_files(remaining_list,
+                                                                max_size_batch)
+        expected_remaining_runs = len(dir_mgr_obj.run_plan)
+        probe_queue = dir_mgr_obj.get_device_queue(working_list,
+                                                   per_device_workers)
+    effective_workers = workers
+    if isinstance(probe_queue, DeviceQueue):
+        effective_workers = min(workers, per_device_workers
+                                * max(1, probe_queue.device_count))
+    if use_ffprobe:
+        from analytics.async_probe import probe_scheduled_files_async
+        probe_results = probe_scheduled_files_async(probe_queue, workers,
+                                                    probe_timeout)
+    else:
+        probe_results = probe_scheduled_files(probe_queue, workers, probe_timeout)
+    total_size_gb = sum(dir_mgr_obj.get_size_gb(file) for file in working_list)
     working_list_count = len(working_list)
     expected_total_processing_time = total_size_gb / proc_speed
-    csv_dict = []
-    csv_raw = []
+    checkpoint_obj = CheckpointWriter(cache_obj, dest_dir, background=True)
+    event_log = EventLog(cache_obj.event_log_file)
     progress_queue = queue.Queue()
     initial_table = {
         "Destination": dest_dir,
@@ -120,11 +213,22 @@ def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
         "Analytics graphs": cache_obj.out_dir_visualization,
         "Full list": cache_obj.file_list_full_file,
         "Processed list": cache_obj.file_list_processed_file,
+        "Event log": cache_obj.event_log_file,
         "Processing speed": proc_speed,
+        "Workers": workers,
+        "Workers per device": per_device_workers,
+        "Effective concurrency": (f'{effective_workers} probes on '
+                                  f'{probe_queue.device_count} device(s)'
+                                  if isinstance(probe_queue, DeviceQueue)
+                                  else effective_workers),
+        "Probe backend": 'ffprobe (asyncio)' if use_ffprobe else 'moviepy',
+        "Probe timeout": (f'{probe_timeout:g} secs' if probe_timeout
+                          else 'disabled'),
         "Allowed execution time": (max_size_batch / proc_speed),
         "Number of total files": len(total_list),
-        "Number of processed files": len(total_list) - len(remaining_list),
+        "Number of processed files": dir_mgr_obj.inventory.processed_count,
         "Number of remaining files": len(remaining_list),
+        "Number of quarantined files": len(dir_mgr_obj.quarantined_files),
         "Number of batch files": working_list_count,
         "Total size": f'{total_list_size:.2f} GB',
         "Batch size": convert_size_mb_to_str(total_size_gb * 1024),
@@ -133,14 +237,16 @@ def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
         "Already processed": f'{processed_list_size * 100 / total_list_size:.2f}%',
         "Expected progress":
             f'{math.floor((processed_list_size + total_size_gb) * 100 / total_list_size)}%',
-        "Expected time": convert_duration_to_str(20 * working_list_count),
+        "Expected time": convert_duration_to_str(20 * working_list_count
+                                                / effective_workers),
         "Expected remaining list size": f'{remaining_list_size - total_size_gb:.2f} GB',
         "Expected remaining list count":
             f'{len(remaining_list) - working_list_count}',
         "Expected remaining runs (at this proc speed)":
-            math.ceil(remaining_list_size / total_size_gb)
+            expected_remaining_runs
     }
     if use_ui:
+        from ui import show_progress_window
         ui_thread = threading.Thread(target=show_progress_window,
                                      args=(initial_table, progress_queue))
         ui_thread.start()
@@ -152,70 +258,126 @@ def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
     initialization_time_end = time.time()
     initialization_time_taken = initialization_time_end - initialization_time_start
     step_times = []
-    for file in working_list:
-        step_time_start = time.time()
-        try:
-            mp4_file = get_video_info(f'{file}')
-            summary_obj.step(file.split(separator)[-1], mp4_file['encoding'],
-                             mp4_file['size'] / (1024 ** 2),
-                             mp4_file['duration'] / 60,
-                             mp4_file['creation_time'],
-                             mp4_file['time_taken'])
-            progress_text = (f"{summary_obj.count_files}/{working_list_count}\t\t"
-                             f"{summary_obj.total_size_gb:.2f}/{total_size_gb:.2f} GB\t\t"
-                             f"{(summary_obj.total_size_gb*100)/total_size_gb:.2f}%\t\t"
-                             f"~{convert_duration_to_str((working_list_count - summary_obj.count_files) * 20)}")
-            if use_ui:
-                progress_queue.put((int((summary_obj.count_files / working_list_count) * 100),
-                                    progress_text))
-            if verbose:
-                display_progress(working_list_count,
-                                 summary_obj.count_files,
-                                 progress_text)
-            csv_dict.append({
-                "file": file.split(separator)[-1],
-                "encoding": mp4_file['encoding'],
-                "size": convert_size_to_str(mp4_file['size']),
-                "duration": convert_duration_to_str(mp4_file['duration']),
-                "creation date": mp4_file['creation_time'],
-                "resolution": convert_resolution_to_str(
-                    mp4_file['resolution_width'],
-                    mp4_file['resolution_height']),
-                "processing time": mp4_file['time_taken']
-            })
-            csv_raw.append({
-                "file": file.split(separator)[-1],
-                "encoding": mp4_file['encoding'],
-                "size (MB)": mp4_file['size'] / (1024 ** 2),
-                "duration (mins)": mp4_file['duration'] / 60,
-                "creation date": mp4_file['creation_time'],
-                "resolution (h)": mp4_file['resolution_height'],
-                "processing time": mp4_file['time_taken']
-            })
-            actual_processed.append(file)
-        except Exception as e:
-            print(f"Error processing file {file}: {e}")
-        finally:
-            gc.collect()
-        step_time_end = time.time()
-        step_times.append(step_time_end - step_time_start)
-    step_time_avg = sum(step_times) / len(step_times)
+    if deadline_secs is not None:
+        scheduler.start(deadline_secs)
+    step_time_start = time.time()
+    try:
+        for file, mp4_file, error, probe_details in probe_results:
+            file_name = dir_mgr_obj.get_relative_path(file)
+            file_size_mb = dir_mgr_obj.get_size_gb(file) * 1024
+            stage = 'probe'
+            try:
+                if error is not None:
+                    raise RuntimeError(error)
+                for stage_name, elapsed in mp4_file['stage_times'].items():
+                    instruments.record(stage_name, elapsed)
+                event_log.log_probe(file_name, file_size_mb,
+                                    probe_details['worker'],
+                                    mp4_file['stage_times'],
+                                    probe_details['elapsed'])
+                stage = 'summary step'
+                summary_step_start = time.perf_counter()
+                summary_obj.step(file_name, mp4_file['encoding'],
+                                 mp4_file['size'] / (1024 ** 2),
+                                 mp4_file['duration'] / 60,
+                                 mp4_file['creation_time'],
+                                 mp4_file['time_taken'])
+                summary_step_time = time.perf_counter() - summary_step_start
+                instruments.record(stage, summary_step_time)
+                event_log.log(file_name, stage, summary_step_time,
+                              size_mb=file_size_mb,
+                              worker=probe_details['worker'])
+                stage = 'record'
+                progress_text = (f"{summary_obj.count_files}/{working_list_count}\t\t"
+                                 f"{summary_obj.total_size_gb:.2f}/{total_size_gb:.2f} GB\t\t"
+                                 f"{(summary_obj.total_size_gb*100)/total_size_gb:.2f}%\t\t"
+                                 f"~{convert_duration_to_str((working_list_count - summary_obj.count_files) * 20)}")
+                if use_ui:
+                    progress_queue.put((min(100, int((summary_obj.count_files / working_list_count) * 100)),
+                                        progress_text))
+                if verbose:
+                    display_progress(working_list_count,
+                                     summary_obj.count_files,
+                                     progress_text)
+                clean_row = {
+                    "file": file_name,
+                    "encoding": mp4_file['encoding'],
+                    "size": convert_size_to_str(mp4_file['size']),
+                    "duration": convert_duration_to_str(mp4_file['duration']),
+                    "creation date": mp4_file['creation_time'],
+                    "resolution": convert_resolution_to_str(
+                        mp4_file['resolution_width'],
+                        mp4_file['resolution_height']),
+                    "processing time": mp4_file['time_taken']
+                }
+                raw_row = {
+                    "file": file_name,
+                    "encoding": mp4_file['encoding'],
+                    "size (MB)": mp4_file['size'] / (1024 ** 2),
+                    "duration (mins)": mp4_file['duration'] / 60,
+                    "creation date": mp4_file['creation_time'],
+                    "resolution (h)": mp4_file['resolution_height'],
+                    "processing time": mp4_file['time_taken']
+                }
+                checkpoint_obj.add(file, clean_row, raw_row,
+                                   (file_name, dir_mgr_obj.get_fingerprint(file),
+                                    raw_row))
+            except PipelineError:
+                # The cache writer failed, not this file: stop the run
+                raise
+            except Exception as e:
+                instruments.count('failed files')
+                event_log.log_error(file_name, file_size_mb,
+                                    probe_details['worker'], stage,
+                                    probe_details['error_class']
+                                    or get_error_class(e), str(e))
+                # A probe stopped at the deadline is retried next run
+                if (stage == 'probe' and probe_details['error_class']
+                        != DEADLINE_ERROR_CLASS):
+                    checkpoint_obj.add_failure((file_name,
+                                                dir_mgr_obj.get_fingerprint(file),
+                                                probe_details['error_class'],
+                                                str(e)))
+                print(f"Error processing file {file}: {e}")
+            finally:
+                gc.collect()
+            step_time_end = time.time()
+            step_times.append(step_time_end - step_time_start)
+            step_time_start = step_time_end
+            if deadline_secs is not None and len(step_times) == 1:
+                # Saved right away, so the prior is corrected even when the
+                # run is cut short
+                cache_obj.write_perf_model(cost_model.to_dict())
+    finally:
+        # Stops the probe workers, and any ffprobe still running, when the
+        # loop ends early. The event log is closed even when the final
+        # commit fails, so the failing run's events are kept.
+        with contextlib.ExitStack() as closing:
+            closing.callback(event_log.close)
+            closing.callback(checkpoint_obj.close)
+            probe_results.close()
+        if verbose:
+            print(f"{checkpoint_obj.committed_count} results checkpointed.")
+    # In deadline mode nothing may have fit once probing started
+    step_time_avg = sum(step_times) / len(step_times) if step_times else 0
     finalization_time_start = time.time()
-    summary_obj.finalize()
-    summary = summary_obj.get_summary_lines()
-    cache_obj.write_processed_files_list(actual_processed)
-    cache_obj.write_summary_file(summary)
-    cache_obj.write_csv_clean_file(csv_dict)
-    cache_obj.write_csv_raw_file(csv_raw)
-    raw_csv_data = cache_obj.read_raw_csv_file()
-    tmp_summary = summary_obj.generate_full_summary(raw_csv_data)
+    if summary_obj.count_files > 0:
+        summary_obj.finalize()
+        summary = summary_obj.get_summary_lines()
+        cache_obj.write_summary_file(summary)
+    tmp_summary = update_history_summary(cache_obj).get_full_summary_lines()
     cache_obj.write_tmp_summary_file(tmp_summary)
+    update_monthly_aggregates(cache_obj.monthly_aggregates_file,
+                              cache_obj.columns_dir)
     # csv_raw_path_name, csv_raw_file_name = os.path.split(cache_obj.csv_raw_file)
     # generate_visualization(csv_raw_path_name + '/', csv_raw_file_name)
     if verbose:
         print("All output files were generated.")
     finalization_time_end = time.time()
     finalization_time_taken = finalization_time_end - finalization_time_start
+    if deadline_secs is not None:
+        cost_model.record_finalization(finalization_time_taken)
+        cache_obj.write_perf_model(cost_model.to_dict())
     end_time = time.time()
     total_time = end_time - start_time
     timetable = {
@@ -231,8 +393,12 @@ def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
             "Total execution":
             convert_duration_to_str(total_time),
             "Average execution per item":
-            convert_duration_to_str(total_time / len(step_times))
+            convert_duration_to_str(total_time / max(1, len(step_times)))
     }
+    if instrument:
+        timetable.update(instruments.get_timetable())
+        instruments.write_json(cache_obj.instrumentation_file)
+        timetable["Instrumentation"] = cache_obj.instrumentation_file
     if use_ui:
         progress_queue.put((100, str(timetable)))
     if verbose:
@@ -242,10 +408,23 @@ def exec(dest_dir: os.PathLike, proj_name: str, separator: str,
     return 0
 
 def main(args: argparse.Namespace) -> int:
-    dest_dir, proj_name, separator, max_size_batch, \
-        proc_speed, verbose, use_ui = process_args(args)
-    return exec(dest_dir, proj_name, separator,
-                max_size_batch, proc_speed, verbose, use_ui)
+    dest_dir, proj_name, separator, max_size_batch, proc_speed, verbose, \
+        use_ui, workers, deadline_secs, instrument, probe_timeout, \
+        per_device_workers, use_ffprobe = process_args(args)
+    exec_args = (dest_dir, proj_name, separator, max_size_batch, proc_speed,
+                 verbose, use_ui, workers, deadline_secs, instrument,
+                 probe_timeout, per_device_workers, use_ffprobe)
+    if not args.profile:
+        return exec(*exec_args)
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(exec, *exec_args)
+    finally:
+        profile_file = CacheRW(proj_name, False).profile_file
+        profiler.dump_stats(profile_file)
+        if verbose:
+            print(f"Profile written to {profile_file}")
 
 if __name__ == '__main__':
     sys.exit(main(parse_arguments()))